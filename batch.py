@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import argparse
+import asyncio
+import contextlib
+import copy
+import itertools
+from dotenv import load_dotenv
+
+from github_client import GitHubClient, AsyncGitHubClient
+from core import (
+    iter_unique_accounts, ensure_ws_path_field,
+    build_final_accounts, load_template, test_all_accounts, split_accounts, SPLIT_KEYS
+)
+from extractor import extract_accounts_from_config
+from converter import inject_outbounds_to_template, update_config_outbounds, SELECTOR_GROUPS
+from ingest import iter_source_lines, iter_links, iter_accounts, iterate_in_thread
+from limiter import AdaptiveLimiter
+from result_cache import open_result_cache
+from geoip_offline import get_offline_geoip
+from metrics import get_metrics
+from tester import CONNECT_SAMPLES
+from ranking import Ranker, parse_regions, REGION_PREFERENCE, TOP_K_PER_REGION
+from config_writer import save_config, spool_config
+
+TEMPLATE_FILE = "template.json"
+MIN_CONCURRENT_TESTS = 10
+INITIAL_CONCURRENT_TESTS = 50
+MAX_CONCURRENT_TESTS = 500
+NDJSON_FIELDS = (
+    "index", "OriginalTag", "VpnType", "Status", "TestType", "Tested IP",
+    "Latency", "P90", "Jitter", "Loss", "ICMP", "Country", "Provider", "Retry", "Handshake",
+)
+
+def log(message):
+    """Pesan progres ke stderr agar stdout tetap bersih untuk NDJSON."""
+    print(message, file=sys.stderr, flush=True)
+
+def add_common_args(parser):
+    """Opsi sumber, tujuan, pengetesan dan ranking yang dipakai bersama mode batch dan watch."""
+    parser.add_argument("--repo", help="owner/nama repo GitHub (token dari GITHUB_TOKEN)")
+    parser.add_argument("--source", help="path config di repo GitHub untuk dites ulang (butuh --repo)")
+    parser.add_argument("--config", help="file config lokal untuk dites ulang")
+    parser.add_argument("--template", default=TEMPLATE_FILE, help="template untuk config akhir")
+    parser.add_argument("--update-in-place", action="store_true",
+                        help="perbarui akun di config sumber secara inkremental, bukan membangun ulang dari template")
+    parser.add_argument("--group", action="append", dest="groups", metavar="TAG",
+                        help=f"grup selector tujuan injeksi (bisa diulang; default: {', '.join(SELECTOR_GROUPS)})")
+    parser.add_argument("--links", action="append", default=[], metavar="FILE",
+                        help="file berisi link VPN; '-' untuk stdin (bisa diulang)")
+    parser.add_argument("--output", help="tulis config akhir ke file ini")
+    parser.add_argument("--upload", metavar="PATH", help="upload config akhir ke path ini di repo GitHub")
+    parser.add_argument("--commit-message", default="Update config VortexVpn (batch)")
+    parser.add_argument("--compact", action="store_true", help="tulis config akhir tanpa indentasi")
+    parser.add_argument("--split", action="append", dest="splits", choices=SPLIT_KEYS, default=[],
+                        help="tulis juga varian config per region/protokol, mis. NAMA-id.json (bisa diulang); "
+                             "dengan --upload semua file masuk dalam satu commit")
+    parser.add_argument("--top-k", type=int, default=TOP_K_PER_REGION, metavar="K",
+                        help="simpan hanya K akun dengan skor terbaik per negara (0 = semua akun yang lolos)")
+    parser.add_argument("--prefer", type=parse_regions, default=REGION_PREFERENCE, metavar="ID,SG,...",
+                        help=f"urutan preferensi negara untuk skor ranking (default: {','.join(REGION_PREFERENCE)})")
+    parser.add_argument("--samples", type=int, default=CONNECT_SAMPLES, metavar="N",
+                        help="sampel connect TCP per endpoint untuk median/P90/jitter/loss (1 = satu sampel saja)")
+    parser.add_argument("--handshake", action="store_true",
+                        help="akun juga harus lolos handshake TLS (SNI) + upgrade WebSocket; Latency = waktu handshake")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="simpan metrik per fase ke FILE (JSON, atau teks Prometheus jika .prom)")
+
+def check_common_args(parser, args):
+    if args.repo is not None:
+        owner, _, name = args.repo.partition("/")
+        if not owner.strip() or not name.strip() or "/" in name:
+            parser.error(f"--repo harus berbentuk owner/nama, bukan '{args.repo}'")
+    if (args.source or args.upload) and not args.repo:
+        parser.error("--source/--upload membutuhkan --repo owner/nama")
+    if args.update_in_place and not (args.source or args.config):
+        parser.error("--update-in-place membutuhkan --source atau --config")
+    if not args.output and not args.upload:
+        parser.error("tentukan minimal satu tujuan: --output atau --upload")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mode batch non-interaktif VortexVpn: tes akun dan tulis config tanpa TUI."
+    )
+    add_common_args(parser)
+    parser.add_argument("--ndjson", default="-", metavar="FILE",
+                        help="tujuan stream hasil per akun dalam NDJSON ('-' = stdout)")
+    parser.add_argument("--force-refresh", action="store_true", help="abaikan cache hasil dan tes ulang semua akun")
+    parser.add_argument("--deadline", type=float, default=15 * 60, help="batas waktu total pengetesan (detik)")
+    parser.add_argument("--shards", type=int, default=1, metavar="N",
+                        help="bagi akun ke N proses worker (untuk jumlah akun sangat besar; 1 = satu proses)")
+    args = parser.parse_args(argv)
+    check_common_args(parser, args)
+    return args
+
+def make_github_client(repo):
+    token = os.getenv("GITHUB_TOKEN")
+    if not repo:
+        return None
+    if not token:
+        raise SystemExit("GITHUB_TOKEN tidak diatur.")
+    owner, name = repo.split("/", 1)
+    return GitHubClient(token, owner, name)
+
+def load_source_config(args, github_client):
+    """Return (config sumber atau None, sha file GitHub atau None)."""
+    if args.source:
+        content, sha = github_client.get_file(args.source)
+        if not content:
+            raise SystemExit(f"Gagal mengambil '{args.source}' dari GitHub.")
+        return json.loads(content), sha
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            return json.load(f), None
+    return None, None
+
+def iter_all_accounts(existing_accounts, link_paths, better=None):
+    """
+    Akun dari config sumber lalu dari link, dibaca dan diparse bertahap, tanpa duplikat.
+    Salinan duplikat dengan tag lebih baik dicatat di `better` (lihat iter_unique_accounts).
+    """
+    links = iter_links(iter_source_lines(link_paths))
+    new_accounts = iter_accounts(links, on_invalid=lambda link: log(f"⚠️ Link tidak valid diabaikan: {link[:50]}..."))
+    for acc in iter_unique_accounts(itertools.chain(existing_accounts, new_accounts), better=better):
+        yield ensure_ws_path_field([acc])[0]
+
+def variant_path(path: str, suffix: str) -> str:
+    if not suffix:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{suffix}{ext or '.json'}"
+
+def build_outputs(args, ranked_results, source_config=None, better=None) -> dict:
+    """
+    {suffix: config} dari hasil terpilih (urut ranking): suffix '' untuk config lengkap,
+    sisanya varian hasil --split. Config sumber tidak diubah (--update-in-place memakai salinan).
+    """
+    groups = tuple(args.groups) if args.groups else SELECTOR_GROUPS
+    final_accounts = build_final_accounts(ranked_results, better)
+    if args.update_in_place:
+        final_config = update_config_outbounds(copy.deepcopy(source_config), final_accounts, groups)
+    else:
+        final_config = inject_outbounds_to_template(load_template(args.template), final_accounts, groups)
+    variants = {"": final_config}
+    for by in args.splits:
+        for key, accounts in split_accounts(ranked_results, final_accounts, by).items():
+            variants.setdefault(key, inject_outbounds_to_template(load_template(args.template), accounts, groups))
+    return variants
+
+def save_outputs(path, variants, compact=False):
+    for suffix, config in variants.items():
+        target = variant_path(path, suffix)
+        save_config(config, target, compact=compact)
+        log(f"✔️ Konfigurasi disimpan sebagai '{target}'")
+
+def commit_outputs(github_client, path, variants, commit_message, compact=False):
+    """Upload semua varian dalam satu commit (dilewati jika isinya tidak berubah)."""
+    with contextlib.ExitStack() as stack:
+        files = {
+            variant_path(path, suffix): stack.enter_context(spool_config(config, compact=compact))
+            for suffix, config in variants.items()
+        }
+        return github_client.commit_files(files, commit_message)
+
+def ndjson_record(result):
+    return {k: result.get(k) for k in NDJSON_FIELDS}
+
+async def run(args, ndjson_out) -> int:
+    load_dotenv()
+    get_offline_geoip()  # database offline yang rusak dilaporkan sekarang, bukan di tengah pengetesan
+    github_client = make_github_client(args.repo)
+    source_config, sha = load_source_config(args, github_client)
+    # Salinan: akun yang diekstrak akan diberi tag baru, config sumber harus tetap utuh untuk --update-in-place
+    existing_accounts = extract_accounts_from_config(copy.deepcopy(source_config)) if source_config else []
+    log("Memulai pengetesan (akun dites sambil input dibaca)...")
+    limiter = AdaptiveLimiter(
+        initial=INITIAL_CONCURRENT_TESTS, floor=MIN_CONCURRENT_TESTS, ceiling=MAX_CONCURRENT_TESTS
+    )
+    total = 0
+    passed = 0
+    ranker = Ranker(top_k=max(args.top_k, 0), preference=args.prefer)
+    prefetch = None
+    if args.upload and args.upload != args.source and not args.splits:
+        # File tujuan (bisa besar) diunduh bersamaan dengan pengetesan; saat upload tinggal revalidasi ETag
+        prefetch = asyncio.ensure_future(AsyncGitHubClient(github_client).get_file(args.upload))
+
+    def on_result(result):
+        nonlocal total, passed
+        total += 1
+        ndjson_out.write(json.dumps(ndjson_record(result), ensure_ascii=False) + "\n")
+        ndjson_out.flush()
+        if result["Status"] == "●":
+            passed += 1
+        ranker.offer(result)
+
+    better = {}  # diisi thread pembaca input, dibaca setelah pengetesan selesai
+    result_cache = open_result_cache()
+    metrics = get_metrics()
+    metrics.reset()
+    try:
+        accounts = iterate_in_thread(iter_all_accounts(existing_accounts, args.links, better))
+        await test_all_accounts(
+            accounts, limiter, deadline=args.deadline, on_result=on_result,
+            result_cache=result_cache, force_refresh=args.force_refresh, handshake=args.handshake,
+            samples=max(args.samples, 1), shards=max(args.shards, 1),
+        )
+    finally:
+        result_cache.close()
+
+    log(f"{passed}/{total} akun lolos tes. {limiter.summary()}")
+    log(ranker.summary())
+    log(result_cache.summary())
+    log(metrics.summary())
+    if args.metrics:
+        metrics.save(args.metrics)
+    if not total:
+        log("❌ Tidak ada akun valid untuk dites.")
+    successful_accounts = ranker.ranked()
+    if not successful_accounts:
+        if prefetch:
+            prefetch.cancel()
+        return 1
+
+    variants = build_outputs(args, successful_accounts, source_config, better)
+    if args.output:
+        save_outputs(args.output, variants, compact=args.compact)
+    if args.upload and len(variants) > 1:
+        response = commit_outputs(github_client, args.upload, variants, args.commit_message, compact=args.compact)
+        log(github_client.summary())
+        if response is None:
+            return 1
+    elif args.upload:
+        if prefetch:
+            await prefetch
+        _, upload_sha = github_client.get_file(args.upload)
+        with spool_config(variants[""], compact=args.compact) as body:
+            response = github_client.update_or_create_file(args.upload, body, args.commit_message, upload_sha)
+        log(github_client.summary())
+        if response is None:
+            return 1
+    return 0
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    ndjson_out = sys.stdout if args.ndjson == "-" else open(args.ndjson, "w", encoding="utf-8")
+    try:
+        # Semua print() modul lain dialihkan ke stderr; stdout hanya untuk NDJSON
+        with contextlib.redirect_stdout(sys.stderr):
+            return asyncio.run(run(args, ndjson_out))
+    finally:
+        if ndjson_out is not sys.stdout:
+            ndjson_out.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
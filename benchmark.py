@@ -0,0 +1,69 @@
+import sys
+import time
+import random
+import base64
+import argparse
+from urllib.parse import urlparse, parse_qs, quote
+
+import converter
+
+SCHEMES = ("vless", "trojan", "ss")
+
+def legacy_parse_query(query: str) -> dict:
+    """Referensi lama (parse_qs) untuk memverifikasi hasil parse_query."""
+    return {k: v[0] for k, v in parse_qs(query).items()}
+
+def make_links(scheme: str, count: int, seed=0) -> list:
+    rng = random.Random(seed)
+    links = []
+    for i in range(count):
+        host = f"cdn{rng.randrange(50)}.example.com"
+        path = quote(f"/{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}-443", safe="")
+        tag = quote(f"Node {i} 🇮🇩", safe="")
+        query = f"type=ws&security=tls&path={path}&host={host}&sni={host}&encryption=none"
+        if scheme == "vless":
+            links.append(f"vless://{rng.getrandbits(128):032x}@{host}:443?{query}#{tag}")
+        elif scheme == "trojan":
+            links.append(f"trojan://pw{rng.getrandbits(32):x}@{host}:443?{query}#{tag}")
+        else:
+            userinfo = base64.urlsafe_b64encode(f"aes-128-gcm:pw{i}".encode()).decode().rstrip("=")
+            links.append(f"ss://{userinfo}@{host}:443?{query}#{tag}")
+    return links
+
+def parse_legacy(links: list) -> list:
+    """Jalankan parser dengan urlparse + parse_qs seperti implementasi sebelumnya."""
+    fast_query, fast_split = converter.parse_query, converter.urlsplit
+    converter.parse_query, converter.urlsplit = legacy_parse_query, urlparse
+    try:
+        return [converter.parse_link(link) for link in links]
+    finally:
+        converter.parse_query, converter.urlsplit = fast_query, fast_split
+
+def measure(func, links) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = func(links)
+    return len(links) / (time.perf_counter() - start), result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark throughput converter.parse_link per skema.")
+    parser.add_argument("--count", type=int, default=50000, help="jumlah link per skema")
+    parser.add_argument("--processes", type=int, default=0, help="ukur juga mode process pool")
+    args = parser.parse_args(argv)
+
+    ok = True
+    for scheme in SCHEMES:
+        links = make_links(scheme, args.count)
+        legacy_rate, legacy = measure(parse_legacy, links)
+        fast_rate, fast = measure(converter.parse_links, links)
+        identical = fast == legacy and repr(fast) == repr(legacy)
+        ok = ok and identical
+        line = f"{scheme:7s} lama {legacy_rate:10,.0f} link/s | baru {fast_rate:10,.0f} link/s"
+        if args.processes > 1:
+            pool_rate, pooled = measure(lambda l: converter.parse_links(l, processes=args.processes), links)
+            ok = ok and pooled == fast
+            line += f" | pool({args.processes}) {pool_rate:10,.0f} link/s"
+        print(f"{line} | identik: {'ya' if identical else 'TIDAK'}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
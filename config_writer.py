@@ -0,0 +1,52 @@
+import os
+import json
+import base64
+import tempfile
+
+WRITE_BUFFER = 64 * 1024  # karakter per write()
+SPOOL_LIMIT = 1024 * 1024  # byte di memori sebelum buffer upload pindah ke disk
+
+def iter_config_chunks(config: dict, compact=False):
+    """Potongan JSON config satu per satu; hasil gabungannya sama dengan json.dumps(indent=2)."""
+    if compact:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+    return encoder.iterencode(config)
+
+def write_config(config: dict, fp, compact=False):
+    """Tulis config ke file teks terbuka secara bertahap, tanpa membangun satu string besar."""
+    buffer = []
+    size = 0
+    for chunk in iter_config_chunks(config, compact):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= WRITE_BUFFER:
+            fp.write("".join(buffer))
+            buffer.clear()
+            size = 0
+    if buffer:
+        fp.write("".join(buffer))
+
+def save_config(config: dict, path: str, compact=False):
+    """Simpan config ke path secara atomik (file sementara lalu rename)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write_config(config, f, compact)
+    os.replace(tmp_path, path)
+
+def spool_config(config: dict, compact=False):
+    """Config sebagai file biner UTF-8 (di memori, pindah ke disk jika besar), posisi di awal."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT, mode="w+b")
+    for chunk in iter_config_chunks(config, compact):
+        spool.write(chunk.encode("utf-8"))
+    spool.seek(0)
+    return spool
+
+def copy_base64(src, dst, block=3 * 64 * 1024):
+    """Base64-encode src (biner) ke dst (biner) per blok kelipatan 3 byte."""
+    while True:
+        data = src.read(block)
+        if not data:
+            return
+        dst.write(base64.b64encode(data))
@@ -1,7 +1,10 @@
 import base64
-from urllib.parse import urlparse, parse_qs, unquote
+from urllib.parse import urlsplit, unquote
+from concurrent.futures import ProcessPoolExecutor
 import re
 
+VPN_LINK_RE = re.compile(r"(?:vless|vmess|trojan|ss)://[^\s]+")
+
 def is_alive(host, port=443):
     try:
         with socket.create_connection((host, int(port)), timeout=5):
@@ -15,6 +18,28 @@ def extract_ip_port_from_path(path):
         return m.group(1), int(m.group(2))
     return None, None
 
+def parse_query(query: str) -> dict:
+    """
+    Scanner query satu lintasan: {nama: nilai pertama}, setara dengan
+    {k: v[0] for k, v in parse_qs(query).items()} (nilai kosong dibuang, '+' jadi spasi).
+    """
+    params = {}
+    if not query:
+        return params
+    for part in query.split("&"):
+        name, sep, value = part.partition("=")
+        if not value:
+            continue
+        if "+" in name:
+            name = name.replace("+", " ")
+        name = unquote(name)
+        if name in params:
+            continue
+        if "+" in value:
+            value = value.replace("+", " ")
+        params[name] = unquote(value)
+    return params
+
 def get_host_to_test(server, ws_host):
     if ws_host:
         if ws_host.startswith(server + "."):
@@ -44,7 +69,7 @@ def parse_ss(link):
             host, port = hostport.split(":", 1)
         else:
             host, port = hostport, ""
-        query_params = parse_qs(query)
+        query_params = parse_query(query)
     else:
         if "?" in url:
             base, query = url.split("?", 1)
@@ -65,25 +90,25 @@ def parse_ss(link):
                 host, port = "", ""
         except Exception:
             method = password = host = port = ""
-        query_params = parse_qs(query)
+        query_params = parse_query(query)
         if not host and "server" in query_params:
-            host = query_params["server"][0]
+            host = query_params["server"]
         if not port and "port" in query_params:
-            port = query_params["port"][0]
+            port = query_params["port"]
     plugin = "v2ray-plugin"
     plugin_opts = []
-    if query_params.get("type", [""])[0] == "ws":
+    if query_params.get("type", "") == "ws":
         plugin_opts.append("mux=0")
     if "path" in query_params:
-        plugin_opts.append(f"path={query_params['path'][0]}")
+        plugin_opts.append(f"path={query_params['path']}")
     if "host" in query_params:
-        plugin_opts.append(f"host={query_params['host'][0]}")
-    if "security" in query_params and query_params["security"][0] == "tls":
+        plugin_opts.append(f"host={query_params['host']}")
+    if query_params.get("security") == "tls":
         plugin_opts.append("tls")
     if "sni" in query_params:
-        plugin_opts.append(f"sni={query_params['sni'][0]}")
+        plugin_opts.append(f"sni={query_params['sni']}")
     if "encryption" in query_params:
-        plugin_opts.append(f"encryption={query_params['encryption'][0]}")
+        plugin_opts.append(f"encryption={query_params['encryption']}")
 
     outbound = {
         "type": "shadowsocks",
@@ -96,14 +121,14 @@ def parse_ss(link):
     if plugin_opts:
         outbound["plugin"] = plugin
         outbound["plugin_opts"] = ";".join(plugin_opts)
-    outbound["_ss_ws_host"] = query_params["host"][0] if "host" in query_params else ""
-    outbound["_ss_path"] = query_params["path"][0] if "path" in query_params else ""
+    outbound["_ss_ws_host"] = query_params.get("host", "")
+    outbound["_ss_path"] = query_params.get("path", "")
     return outbound
 
 def parse_vless(link):
-    url = urlparse(link)
-    params = parse_qs(url.query)
-    net = params.get("type", ["ws"])[0]
+    url = urlsplit(link)
+    params = parse_query(url.query)
+    net = params.get("type", "ws")
     outbound = {
         "type": "vless",
         "tag": unquote(url.fragment) if url.fragment else url.hostname,
@@ -111,28 +136,28 @@ def parse_vless(link):
         "server_port": int(url.port or 443),
         "uuid": url.username,
         "tls": {
-            "enabled": params.get("security", ["tls"])[0] == "tls",
-            "server_name": params.get("sni", [url.hostname])[0],
-            "insecure": params.get("allowInsecure", ["false"])[0] == "true",
+            "enabled": params.get("security", "tls") == "tls",
+            "server_name": params.get("sni", url.hostname),
+            "insecure": params.get("allowInsecure", "false") == "true",
         },
         "transport": {},
     }
     if net == "ws":
         outbound["transport"] = {
             "type": "ws",
-            "path": params.get("path", [""])[0],
-            "headers": {"Host": params.get("host", [url.hostname])[0]},
+            "path": params.get("path", ""),
+            "headers": {"Host": params.get("host", url.hostname)},
         }
-        outbound["_ws_host"] = params.get("host", [""])[0]
-        outbound["_ws_path"] = params.get("path", [""])[0]
+        outbound["_ws_host"] = params.get("host", "")
+        outbound["_ws_path"] = params.get("path", "")
     else:
         outbound["_ws_host"] = ""
         outbound["_ws_path"] = ""
     return outbound
 
 def parse_trojan(link):
-    url = urlparse(link)
-    params = parse_qs(url.query)
+    url = urlsplit(link)
+    params = parse_query(url.query)
     outbound = {
         "type": "trojan",
         "tag": unquote(url.fragment) if url.fragment else url.hostname,
@@ -140,52 +165,132 @@ def parse_trojan(link):
         "server_port": int(url.port or 443),
         "password": url.username,
         "tls": {
-            "enabled": params.get("security", ["tls"])[0] == "tls",
-            "server_name": params.get("sni", [url.hostname])[0],
-            "insecure": params.get("allowInsecure", ["false"])[0] == "true",
+            "enabled": params.get("security", "tls") == "tls",
+            "server_name": params.get("sni", url.hostname),
+            "insecure": params.get("allowInsecure", "false") == "true",
         },
         "transport": {},
     }
-    net = params.get("type", ["ws"])[0]
+    net = params.get("type", "ws")
     if net == "ws":
         outbound["transport"] = {
             "type": "ws",
-            "path": params.get("path", [""])[0],
-            "headers": {"Host": params.get("host", [url.hostname])[0]},
+            "path": params.get("path", ""),
+            "headers": {"Host": params.get("host", url.hostname)},
         }
-        outbound["_ws_host"] = params.get("host", [""])[0]
-        outbound["_ws_path"] = params.get("path", [""])[0]
+        outbound["_ws_host"] = params.get("host", "")
+        outbound["_ws_path"] = params.get("path", "")
     else:
         outbound["_ws_host"] = ""
         outbound["_ws_path"] = ""
     return outbound
 
+PARSERS = {"vless": parse_vless, "trojan": parse_trojan, "ss": parse_ss}
+
 def parse_link(link):
-    if link.startswith("vless://"):
-        return parse_vless(link)
-    elif link.startswith("trojan://"):
-        return parse_trojan(link)
-    elif link.startswith("ss://"):
-        return parse_ss(link)
-    else:
-        return None
+    parser = PARSERS.get(link.partition("://")[0]) if "://" in link else None
+    return parser(link) if parser else None
+
+def _parse_chunk(links):
+    return [parse_link(link) for link in links]
+
+def parse_links(links, processes=None, chunksize=5000) -> list:
+    """
+    parse_link untuk banyak link; urutan dan hasil sama dengan parse berurutan.
+    processes > 1 membagi link per chunk ke process pool (berguna untuk ratusan ribu link).
+    """
+    links = list(links)
+    if not processes or processes <= 1 or len(links) <= chunksize:
+        return _parse_chunk(links)
+    chunks = [links[i:i + chunksize] for i in range(0, len(links), chunksize)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return [outbound for chunk in pool.map(_parse_chunk, chunks) for outbound in chunk]
+
+SELECTOR_GROUPS = ("Internet", "Best Latency", "Lock Region ID")
+ACCOUNT_TYPES = {"vmess", "vless", "trojan", "shadowsocks"}
+
+class TemplateIndex:
+    """
+    Index sekali jalan atas outbounds sebuah template/config: tag -> posisi dan
+    grup selector -> set anggota, sehingga injeksi ribuan akun berjalan linear.
+    """
+
+    def __init__(self, config: dict, groups=SELECTOR_GROUPS):
+        self.config = config
+        self.outbounds = config.setdefault("outbounds", [])
+        self.positions = {}
+        self.groups = {}
+        for i, outbound in enumerate(self.outbounds):
+            tag = outbound.get("tag")
+            self.positions.setdefault(tag, i)
+            if tag in groups:
+                members = outbound.setdefault("outbounds", [])
+                self.groups[tag] = (members, set(members))
 
-def inject_outbounds_to_template(template_data: dict, new_outbounds: list) -> dict:
+    def add_to_groups(self, tags):
+        for members, member_set in self.groups.values():
+            for tag in tags:
+                if tag not in member_set:
+                    member_set.add(tag)
+                    members.append(tag)
+
+    def remove_from_groups(self, tags: set):
+        for name, (members, member_set) in self.groups.items():
+            if member_set & tags:
+                members[:] = [t for t in members if t not in tags]
+                self.groups[name] = (members, set(members))
+
+    def insert(self, new_outbounds: list, before="direct"):
+        """Sisipkan outbound baru sebelum outbound `before` (atau di akhir jika tidak ada)."""
+        insert_index = self.positions.get(before, -1)
+        if insert_index != -1:
+            self.outbounds[insert_index:insert_index] = new_outbounds
+        else:
+            self.outbounds.extend(new_outbounds)
+        self.reindex()
+
+    def reindex(self):
+        self.positions = {}
+        for i, outbound in enumerate(self.outbounds):
+            self.positions.setdefault(outbound.get("tag"), i)
+
+def inject_outbounds_to_template(template_data: dict, new_outbounds: list, groups=SELECTOR_GROUPS) -> dict:
     if not new_outbounds:
         return template_data
-    all_new_tags = [acc['tag'] for acc in new_outbounds]
-    for tag in all_new_tags:
-        print("TAG INJECTED:", tag)
-    for outbound in template_data.get("outbounds", []):
-        if outbound.get("tag") in ["Internet", "Best Latency", "Lock Region ID"]:
-            outbound_list = outbound.get("outbounds", [])
-            for tag in all_new_tags:
-                if tag not in outbound_list:
-                    outbound_list.append(tag)
-    outbounds_list = template_data["outbounds"]
-    insert_index = next((i for i, o in enumerate(outbounds_list) if o.get("tag") == "direct"), -1)
-    if insert_index != -1:
-        template_data["outbounds"] = outbounds_list[:insert_index] + new_outbounds + outbounds_list[insert_index:]
-    else:
-        template_data["outbounds"].extend(new_outbounds)
-    return template_data
\ No newline at end of file
+    index = TemplateIndex(template_data, groups)
+    index.add_to_groups([acc['tag'] for acc in new_outbounds])
+    index.insert(new_outbounds)
+    print(f"✔️ {len(new_outbounds)} akun diinjeksi ke grup: {', '.join(index.groups) or '-'}")
+    return template_data
+
+def update_config_outbounds(config: dict, new_outbounds: list, groups=SELECTOR_GROUPS) -> dict:
+    """
+    Update in-place config yang sudah ada: akun lama yang tidak ada lagi dibuang dari
+    outbounds dan grup, akun dengan tag sama diganti di tempat, akun baru disisipkan.
+    Outbound non-akun (selector, direct, dns, ...) tidak disentuh.
+    """
+    index = TemplateIndex(config, groups)
+    new_by_tag = {acc['tag']: acc for acc in new_outbounds}
+    stale = {
+        o.get("tag") for o in index.outbounds
+        if o.get("type") in ACCOUNT_TYPES and o.get("tag") not in new_by_tag
+    }
+    kept = []
+    replaced = set()
+    for outbound in index.outbounds:
+        tag = outbound.get("tag")
+        if outbound.get("type") in ACCOUNT_TYPES:
+            if tag in stale or tag in replaced:
+                continue
+            if tag in new_by_tag:
+                outbound = new_by_tag.pop(tag)
+                replaced.add(tag)
+        kept.append(outbound)
+    index.outbounds[:] = kept
+    index.reindex()
+    index.remove_from_groups(stale)
+    added = list(new_by_tag.values())
+    index.add_to_groups([acc['tag'] for acc in new_outbounds])
+    index.insert(added)
+    print(f"✔️ Config diperbarui: {len(added)} akun baru, {len(new_outbounds) - len(added)} diganti, {len(stale)} dibuang.")
+    return config
@@ -1,29 +1,79 @@
 import re
 import json
+import time
 import asyncio
+from collections import OrderedDict
+from collections.abc import Sequence
 from converter import extract_ip_port_from_path
-from tester import test_account
+from tester import (
+    get_test_target, new_result, apply_probe, probe_endpoint, probe_handshake, apply_handshake, CONNECT_SAMPLES
+)
+from handshake import handshake_params
+from fingerprint import account_fingerprint, canonical_key
+from utils import get_country_code
+from metrics import get_metrics
 
 def clean_account_dict(account: dict) -> dict:
     return {k: v for k, v in account.items() if not k.startswith("_")}
 
+def tag_quality(account: dict) -> int:
+    """2 = tag deskriptif, 1 = tag hanya host/server (default parser), 0 = kosong."""
+    tag = str(account.get("tag") or "").strip()
+    if not tag:
+        return 0
+    if tag.lower() in (str(account.get("server") or "").lower(), "ss", "proxy"):
+        return 1
+    return 2
+
 def deduplicate_accounts(accounts: list) -> list:
-    # Simple: no deduplication. Add logic if needed.
-    return accounts
+    """
+    Buang akun duplikat (koneksi sama, tag berbeda) dengan index hash kunci kanonik, O(n).
+    Urutan kemunculan pertama dipertahankan; salinan dengan tag terbaik yang disimpan.
+    """
+    kept = []
+    index = {}
+    for acc in accounts:
+        if not isinstance(acc, dict):
+            continue
+        key = canonical_key(acc)
+        pos = index.get(key)
+        if pos is None:
+            index[key] = len(kept)
+            kept.append(acc)
+        elif tag_quality(acc) > tag_quality(kept[pos]):
+            kept[pos] = acc
+    removed = len(accounts) - len(kept)
+    if removed:
+        print(f"✔️ {removed} akun duplikat dibuang, tersisa {len(kept)} akun unik.")
+    return kept
 
-def sort_priority(res):
-    country = res.get("Country", "")
-    if "🇮🇩" in country:
-        return (0,)
-    if "🇸🇬" in country:
-        return (1,)
-    if "🇯🇵" in country:
-        return (2,)
-    if "🇰🇷" in country:
-        return (3,)
-    if "🇺🇸" in country:
-        return (4,)
-    return (5, country)
+DEDUP_WINDOW = 10000  # akun terakhir yang masih bisa diganti salinan dengan tag lebih baik
+
+def iter_unique_accounts(accounts, window=DEDUP_WINDOW, better=None):
+    """
+    Versi streaming deduplicate_accounts: salinan pertama langsung diteruskan (dan dites).
+    Akun yang sudah diteruskan tidak pernah diubah (sedang dipakai loop/shard/NDJSON); jika
+    salinan berikutnya punya tag lebih baik, salinan itu dicatat di `better` (kunci kanonik ->
+    akun) untuk dipakai build_final_accounts. Hanya untuk `window` akun unik terakhir agar memori terbatas.
+    """
+    seen = set()
+    recent = OrderedDict()  # kunci kanonik -> tag_quality salinan terbaik sejauh ini
+    for acc in accounts:
+        if not isinstance(acc, dict):
+            continue
+        key = canonical_key(acc)
+        if key not in seen:
+            seen.add(key)
+            recent[key] = tag_quality(acc)
+            if len(recent) > window:
+                recent.popitem(last=False)
+            yield acc
+            continue
+        quality = recent.get(key)
+        if quality is not None and tag_quality(acc) > quality:
+            recent[key] = tag_quality(acc)
+            if better is not None:
+                better[key] = acc
 
 def clean_provider_name(provider):
     provider = re.sub(r"\(.*?\)", "", provider)
@@ -48,22 +98,207 @@ def ensure_ws_path_field(accounts: list) -> list:
                 acc["_ws_path"] = transport.get("path", "")
     return accounts
 
-async def test_all_accounts(accounts: list, semaphore, live_results):
-    tasks = [
-        test_account(acc, semaphore, i, live_results)
-        for i, acc in enumerate(accounts)
-    ]
+MAX_PENDING_ACCOUNTS = 2000  # akun yang boleh menunggu hasil sekaligus (batas memori mode streaming)
+RESULT_CACHE_FLUSH = 200
+
+async def _aiter(accounts):
+    if hasattr(accounts, "__aiter__"):
+        async for acc in accounts:
+            yield acc
+    else:
+        for acc in accounts:
+            yield acc
+
+async def test_all_accounts(accounts, semaphore, live_results=None, deadline=None, on_result=None,
+                            result_cache=None, force_refresh=False, max_pending=MAX_PENDING_ACCOUNTS,
+                            handshake=False, samples=CONNECT_SAMPLES, shards=1):
+    """
+    Tes semua akun, tapi setiap endpoint (ip, port) unik hanya di-probe sekali;
+    hasilnya dibagikan ke semua akun yang mengarah ke endpoint tersebut.
+    accounts boleh list atau iterable/async iterable: akun langsung direncanakan dan
+    di-probe begitu datang, dengan paling banyak max_pending akun menunggu sekaligus,
+    sehingga probing berjalan bersamaan dengan ingest.
+    deadline (detik) membatasi waktu total run: probe yang belum selesai dibatalkan
+    dan akunnya ditandai '✖ (Deadline)', begitu juga sisa akun jika accounts berupa list;
+    sisa stream input tidak ditunggu dan tidak dibaca lagi.
+    on_result(result) dipanggil begitu hasil satu akun selesai; jika diberikan, hasil
+    tidak dikumpulkan di list return (memori tetap datar untuk input besar).
+    result_cache (ResultCache) dipakai ulang untuk akun yang hasilnya belum kedaluwarsa;
+    hanya akun baru/berubah/kedaluwarsa yang di-probe, kecuali force_refresh=True.
+    handshake=True: akun yang lolos probe TCP juga harus lolos handshake TLS (SNI) dan
+    upgrade WebSocket ke server akun; Latency menjadi waktu handshake tersebut.
+    samples: jumlah sampel connect TCP per endpoint untuk Latency (median)/P90/Jitter/Loss.
+    shards > 1: akun dibagi ke beberapa proses worker (lihat shard.test_all_accounts_sharded).
+    """
+    if shards > 1:
+        from shard import test_all_accounts_sharded  # shard mengimpor modul ini
+        return await test_all_accounts_sharded(
+            accounts, semaphore, shards, live_results=live_results, deadline=deadline, on_result=on_result,
+            result_cache=result_cache, force_refresh=force_refresh, max_pending=max_pending,
+            handshake=handshake, samples=samples,
+        )
+    loop = asyncio.get_running_loop()
+    run_deadline = loop.time() + deadline if deadline else None
     results = []
-    for future in asyncio.as_completed(tasks):
-        result = await future
-        live_results[result["index"]].update(result)
-        results.append(result)
+    probes = {}  # (ip, port) -> Task probe endpoint (hasil selesai dipakai ulang akun berikutnya)
+    members = {}  # (ip, port) -> index akun yang sedang menunggu probe tersebut
+    handshakes = {}  # parameter handshake -> Task probe_handshake (dibagi akun dengan front yang sama)
+    waiting = {}  # index -> akun yang belum punya hasil
+    fresh = {}  # fingerprint -> hasil baru yang belum ditulis ke cache
+    admission = asyncio.Semaphore(max_pending)
+    admits = set()
+    metrics = get_metrics()
+
+    def publish(result):
+        waiting.pop(result["index"], None)
+        metrics.inc("accounts_ok" if result["Status"] == "●" else "accounts_failed")
+        if live_results is not None:
+            live_results[result["index"]].update(result)
+        if on_result is not None:
+            on_result(result)
+        else:
+            results.append(result)
+
+    def flush_cache(force=False):
+        if result_cache is not None and fresh and (force or len(fresh) >= RESULT_CACHE_FLUSH):
+            result_cache.put_many(fresh)
+            fresh.clear()
+
+    async def probe_group(endpoint):
+        def on_status(status, retry):
+            for i in members.get(endpoint, ()):
+                live_results[i].update({"Status": status, "Retry": retry})
+
+        try:
+            return await probe_endpoint(
+                *endpoint, on_status if live_results is not None else None, semaphore, samples=samples
+            )
+        finally:
+            members.pop(endpoint, None)
+
+    async def admit(i, acc):
+        try:
+            await evaluate(i, acc)
+        except Exception as e:
+            # Setiap akun harus tetap sampai ke publish, apa pun yang gagal di tengah jalan
+            metrics.inc("account_errors")
+            print(f"⚠️ Error saat mengetes akun '{acc.get('tag', i)}': {type(e).__name__}: {e}")
+            if i in waiting:
+                result = new_result(acc, i)
+                result["Status"] = f"✖ (Error: {type(e).__name__})"
+                publish(result)
+        finally:
+            admission.release()
+
+    async def evaluate(i, acc):
+        started = time.perf_counter()
+        fingerprint = None
+        if result_cache is not None:
+            # Hasil mode handshake disimpan terpisah dari hasil probe TCP saja
+            fingerprint = account_fingerprint(acc) + ("/handshake" if handshake else "")
+            cached = None if force_refresh else result_cache.get(fingerprint)
+            if cached is not None:
+                metrics.inc("cache_hits")
+                publish(new_result(acc, i) | cached)
+                return
+            metrics.inc("cache_misses")
+        with metrics.timer("dns"):
+            ip, port, source = await get_test_target(acc)
+        if not ip:
+            metrics.inc("no_target")
+            result = new_result(acc, i)
+            result["Status"] = "✖ (No valid IP/host)"
+            publish(result)
+            return
+        endpoint = (ip, int(port))
+        task = probes.get(endpoint)
+        if task is None:
+            task = probes[endpoint] = asyncio.ensure_future(probe_group(endpoint))
+        else:
+            metrics.inc("endpoint_shared")
+        if not task.done():
+            members.setdefault(endpoint, []).append(i)
+        probe = await asyncio.shield(task)
+        result = apply_probe(new_result(acc, i), probe, source)
+        params = handshake_params(acc) if handshake and result["Status"] == "●" else None
+        if params is not None:
+            key = tuple(params.items())
+            task = handshakes.get(key)
+            if task is None:
+                task = handshakes[key] = asyncio.ensure_future(probe_handshake(params, semaphore))
+            apply_handshake(result, await asyncio.shield(task))
+        if fingerprint is not None:
+            fresh[fingerprint] = result
+            flush_cache()
+        publish(result)
+        metrics.observe("account", time.perf_counter() - started)
+
+    def remaining():
+        return None if run_deadline is None else max(run_deadline - loop.time(), 0)
+
+    index = 0
+    timed_out = False
+    source = _aiter(accounts)
+    try:
+        while True:
+            # Menunggu input juga dibatasi deadline (stdin yang lambat atau tidak pernah selesai)
+            try:
+                acc = await asyncio.wait_for(anext(source), timeout=remaining())
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                timed_out = True
+                break
+            waiting[index] = acc
+            try:
+                await asyncio.wait_for(admission.acquire(), timeout=remaining())
+            except asyncio.TimeoutError:
+                timed_out = True
+                index += 1
+                break
+            task = asyncio.ensure_future(admit(index, acc))
+            admits.add(task)
+            task.add_done_callback(admits.discard)
+            index += 1
+        if admits and not timed_out:
+            _, still_pending = await asyncio.wait(set(admits), timeout=remaining())
+            timed_out = bool(still_pending)
+    finally:
+        for task in list(admits) + list(probes.values()) + list(handshakes.values()):
+            task.cancel()
+        await asyncio.gather(*admits, *probes.values(), *handshakes.values(), return_exceptions=True)
+        await source.aclose()
+        flush_cache(force=True)
+
+    if timed_out:
+        stopped = len(waiting)
+        metrics.inc("deadline_expired", stopped)
+        if isinstance(accounts, Sequence):
+            # Panjang input diketahui: sisa akun ikut ditandai Deadline tanpa perlu membaca stream
+            for i in range(index, len(accounts)):
+                waiting[i] = accounts[i]
+            metrics.inc("deadline_unread", len(accounts) - index)
+            skipped = f"{len(accounts) - index} akun belum dites"
+        else:
+            # Stream (mis. stdin) tidak dibaca lagi; jumlah sisanya tidak diketahui
+            metrics.inc("deadline_stream_cut")
+            skipped = "sisa input tidak dibaca"
+        for i, acc in sorted(waiting.items()):
+            result = new_result(acc, i)
+            result["Status"] = "✖ (Deadline)"
+            publish(result)
+        print(f"⏱️ Deadline habis: {stopped} akun dihentikan, {skipped}.")
     return results
 
-def build_final_accounts(successful_results):
+def build_final_accounts(successful_results, better=None):
+    """Akun final bertag dari hasil terpilih; `better` (dari iter_unique_accounts) menggantikan salinan bertag jelek."""
     final_accounts = []
     for i, res in enumerate(successful_results):
         account_obj = res["OriginalAccount"]
+        if better:
+            replacement = better.get(canonical_key(account_obj))
+            if replacement is not None:
+                account_obj = dict(replacement)
         country = res["Country"]
         provider = clean_provider_name(res["Provider"])
         tag = f"{country} {provider} -{i+1}"
@@ -72,6 +307,23 @@ def build_final_accounts(successful_results):
         final_accounts.append(clean_account_dict(account_obj))
     return final_accounts
 
+SPLIT_KEYS = ("region", "protocol")
+
+def split_key(result: dict, by: str) -> str:
+    """Kunci varian sebuah hasil tes: kode negara (region) atau tipe akun (protocol), huruf kecil."""
+    if by == "region":
+        key = get_country_code(result.get("Country"))
+    else:
+        key = str(result.get("VpnType") or "")
+    return key.lower() or "unknown"
+
+def split_accounts(successful_results, final_accounts, by: str) -> dict:
+    """Kelompokkan akun final (pasangan hasil build_final_accounts) per kunci varian, urutan tetap."""
+    groups = {}
+    for result, account in zip(successful_results, final_accounts):
+        groups.setdefault(split_key(result, by), []).append(account)
+    return groups
+
 def load_template(template_file):
     with open(template_file, "r") as f:
         return json.load(f)
\ No newline at end of file
@@ -0,0 +1,60 @@
+import json
+import hashlib
+from urllib.parse import unquote
+
+def _norm_host(value) -> str:
+    return str(value or "").strip().lower().rstrip(".")
+
+def _norm_path(value) -> str:
+    path = unquote(str(value or "").strip())
+    if path and not path.startswith("/"):
+        path = "/" + path
+    return path
+
+def parse_plugin_opts(opts: str) -> dict:
+    """Opsi plugin SS "a=1;tls;path=/x" -> {"a": "1", "tls": True, "path": "/x"}."""
+    result = {}
+    for part in str(opts or "").split(";"):
+        key, _, value = part.partition("=")
+        if key:
+            result[key.strip()] = value.strip() if value else True
+    return result
+
+def canonical_key(account: dict) -> tuple:
+    """
+    Kunci kanonik koneksi sebuah outbound (hasil parse_* maupun outbound dari extractor):
+    type, server, port, uuid/password, path/host transport, SNI dan TLS, dinormalisasi.
+    Tag dan field internal '_' tidak ikut sehingga salinan dengan tag berbeda dianggap sama.
+    """
+    acc_type = str(account.get("type", "")).lower()
+    server = _norm_host(account.get("server"))
+    try:
+        port = int(account.get("server_port") or 443)
+    except (TypeError, ValueError):
+        port = 443
+    if acc_type == "shadowsocks":
+        opts = parse_plugin_opts(account.get("plugin_opts"))
+        credential = (str(account.get("method", "")).lower(), str(account.get("password", "")))
+        path = _norm_path(opts.get("path", ""))
+        host = _norm_host(opts.get("host", ""))
+        sni = _norm_host(opts.get("sni", ""))
+        tls = "tls" in opts
+    else:
+        credential = (str(account.get("uuid", "")).lower() if "uuid" in account else str(account.get("password", "")),)
+        transport = account.get("transport") if isinstance(account.get("transport"), dict) else {}
+        headers = transport.get("headers") if isinstance(transport.get("headers"), dict) else {}
+        tls_opts = account.get("tls") if isinstance(account.get("tls"), dict) else {}
+        path = _norm_path(transport.get("path", ""))
+        host = _norm_host(headers.get("Host") or headers.get("host") or "")
+        sni = _norm_host(tls_opts.get("server_name") or tls_opts.get("sni") or "")
+        tls = bool(tls_opts.get("enabled"))
+        credential += (str(transport.get("type", "")).lower(),)
+    # Host/SNI yang sama dengan server adalah nilai default parser, jadi disamakan dengan kosong
+    host = "" if host == server else host
+    sni = "" if sni == server else sni
+    return (acc_type, server, port, credential, path, host, sni, tls)
+
+def account_fingerprint(account: dict) -> str:
+    """Fingerprint stabil dari kunci kanonik; tidak berubah jika hanya tag yang diganti."""
+    canonical = json.dumps(canonical_key(account), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import requests
+from requests.adapters import HTTPAdapter
+from utils import GEOIP_DEFAULT, geo_from_api
+from geoip_cache import get_geoip_cache
+from geoip_offline import get_offline_geoip
+
+GEOIP_BATCH_URL = "http://ip-api.com/batch?fields=status,countryCode,isp,org,query"
+GEOIP_BATCH_SIZE = 100  # batas maksimum endpoint /batch
+GEOIP_BATCH_LINGER = 0.25  # detik menunggu IP lain sebelum batch dikirim
+GEOIP_BATCH_RETRIES = 3
+
+class GeoIPBatcher:
+    """
+    Tahap GeoIP ber-batch: IP dari probe yang sukses dikumpulkan lalu dikirim
+    sebagai satu POST ke /batch (maks. 100 IP) lewat requests.Session yang di-pool.
+    Hit cache tidak pernah masuk batch; IP yang sama yang sedang menunggu digabung.
+    Header rate-limit ip-api (X-Rl = sisa request, X-Ttl = detik sampai reset) dihormati.
+    """
+
+    def __init__(self, url=GEOIP_BATCH_URL, batch_size=GEOIP_BATCH_SIZE, linger=GEOIP_BATCH_LINGER,
+                 cache=None, session=None, timeout=10):
+        self.url = url
+        self.batch_size = batch_size
+        self.linger = linger
+        self.cache = cache or get_geoip_cache()
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session = session
+        self._pending = {}  # ip -> Future yang belum dikirim
+        self._inflight = {}  # ip -> Future yang sedang dikirim
+        self._flush_handle = None
+        self._flush_tasks = set()  # referensi kuat: event loop hanya menyimpan weakref ke task
+        self._send_lock = None
+        self._blocked_until = 0.0
+        self.stats = {"lookups": 0, "cache_hits": 0, "requests": 0, "ips_sent": 0, "rate_limited": 0}
+
+    async def lookup(self, ip: str) -> dict:
+        if not ip or not isinstance(ip, str):
+            return dict(GEOIP_DEFAULT)
+        self.stats["lookups"] += 1
+        offline_db = get_offline_geoip()
+        if offline_db is not None:
+            return geo_from_api(offline_db.lookup(ip)) or dict(GEOIP_DEFAULT)
+        cached = self.cache.get(ip)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        future = self._pending.get(ip) or self._inflight.get(ip)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[ip] = future
+            if len(self._pending) >= self.batch_size:
+                self._schedule_flush(0)
+            else:
+                self._schedule_flush(self.linger)
+        return dict(await asyncio.shield(future))
+
+    async def lookup_many(self, ips) -> dict:
+        ips = list(dict.fromkeys(ips))
+        results = await asyncio.gather(*(self.lookup(ip) for ip in ips))
+        return dict(zip(ips, results))
+
+    def _schedule_flush(self, delay):
+        if self._flush_handle is not None:
+            if delay > 0:
+                return
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        task = asyncio.ensure_future(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self):
+        self._flush_handle = None
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        while self._pending:
+            batch = dict(list(self._pending.items())[:self.batch_size])
+            for ip in batch:
+                del self._pending[ip]
+            self._inflight.update(batch)
+            try:
+                async with self._send_lock:
+                    found = await self._send(list(batch))
+            except Exception:
+                found = {}
+            if found:
+                self.cache.put_many(found)
+            for ip, future in batch.items():
+                self._inflight.pop(ip, None)
+                if not future.done():
+                    future.set_result(found.get(ip, GEOIP_DEFAULT))
+
+    async def _send(self, ips: list) -> dict:
+        for _ in range(GEOIP_BATCH_RETRIES):
+            wait = self._blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.stats["requests"] += 1
+            self.stats["ips_sent"] += len(ips)
+            try:
+                response = await asyncio.to_thread(self.session.post, self.url, json=ips, timeout=self.timeout)
+            except requests.RequestException:
+                return {}
+            self._note_rate_limit(response)
+            if response.status_code == 429:
+                self.stats["rate_limited"] += 1
+                continue
+            if response.status_code != 200:
+                return {}
+            found = {}
+            for item in response.json():
+                geo = geo_from_api(item)
+                if geo and item.get("query"):
+                    found[item["query"]] = geo
+            return found
+        return {}
+
+    def _note_rate_limit(self, response):
+        remaining = response.headers.get("X-Rl")
+        reset = response.headers.get("X-Ttl")
+        try:
+            if response.status_code == 429 or (remaining is not None and int(remaining) <= 0):
+                self._blocked_until = time.monotonic() + max(int(reset or 60), 1)
+        except ValueError:
+            pass
+
+    def close(self):
+        self.session.close()
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"GeoIP batch: {s['lookups']} lookup, {s['cache_hits']} dari cache, "
+            f"{s['ips_sent']} IP dalam {s['requests']} request, {s['rate_limited']}x rate-limit"
+        )
+
+_default_batcher = None
+
+def get_geoip_batcher() -> GeoIPBatcher:
+    global _default_batcher
+    if _default_batcher is None:
+        _default_batcher = GeoIPBatcher(url=os.getenv("GEOIP_BATCH_URL", GEOIP_BATCH_URL))
+    return _default_batcher
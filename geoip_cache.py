@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+GEOIP_CACHE_FILE = ".geoip_cache.sqlite"
+GEOIP_CACHE_TTL = 7 * 24 * 3600  # detik
+GEOIP_CACHE_MEMORY_SIZE = 4096  # entri LRU di memori
+
+def prefix24_key(ip: str) -> str:
+    parts = ip.split(".")
+    if len(parts) != 4:
+        return ip
+    return ".".join(parts[:3]) + ".0/24"
+
+class GeoIPCache:
+    """
+    Cache GeoIP dua lapis: LRU di memori di atas store SQLite di disk yang bertahan antar run.
+    Entri lebih tua dari ttl dianggap miss. prefix24=True menyimpan per /24, bukan per IP.
+    """
+
+    def __init__(self, path=GEOIP_CACHE_FILE, ttl=GEOIP_CACHE_TTL, maxsize=GEOIP_CACHE_MEMORY_SIZE, prefix24=False):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.prefix24 = prefix24
+        self._memory = OrderedDict()  # key -> (stored_at, info)
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+
+    def _conn(self):
+        if self._db is None and self.path:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geoip (key TEXT PRIMARY KEY, stored_at REAL, info TEXT)"
+            )
+        return self._db
+
+    def key(self, ip: str) -> str:
+        return prefix24_key(ip) if self.prefix24 else ip
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, ip: str) -> dict | None:
+        key = self.key(ip)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            source = "memory_hits"
+            if entry is None:
+                db = self._conn()
+                row = db.execute("SELECT stored_at, info FROM geoip WHERE key = ?", (key,)).fetchone() if db else None
+                if row:
+                    entry = (row[0], json.loads(row[1]))
+                    source = "disk_hits"
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if now - entry[0] > self.ttl:
+                self._memory.pop(key, None)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._remember(key, entry)
+            self.stats["hits"] += 1
+            self.stats[source] += 1
+            return dict(entry[1])
+
+    def put(self, ip: str, info: dict):
+        self.put_many({ip: info})
+
+    def put_many(self, items: dict):
+        """Simpan banyak {ip: info} sekaligus dalam satu transaksi disk."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for ip, info in items.items():
+                key = self.key(ip)
+                entry = (now, dict(info))
+                self._remember(key, entry)
+                rows.append((key, now, json.dumps(entry[1], ensure_ascii=False)))
+            db = self._conn()
+            if db:
+                db.executemany("INSERT OR REPLACE INTO geoip (key, stored_at, info) VALUES (?, ?, ?)", rows)
+                db.commit()
+            self.stats["stores"] += len(rows)
+
+    def prune(self):
+        """Hapus entri kedaluwarsa dari disk."""
+        with self._lock:
+            db = self._conn()
+            if db:
+                db.execute("DELETE FROM geoip WHERE stored_at < ?", (time.time() - self.ttl,))
+                db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"GeoIP cache: {s['hits']} hit (memori {s['memory_hits']}, disk {s['disk_hits']}), "
+            f"{s['misses']} miss, hit rate {self.hit_rate:.0%}"
+        )
+
+_default_cache = None
+
+def get_geoip_cache() -> GeoIPCache:
+    """Cache default, dibuat saat pertama dipakai agar variabel dari .env sudah termuat."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = GeoIPCache(
+            path=os.getenv("GEOIP_CACHE_FILE", GEOIP_CACHE_FILE),
+            ttl=float(os.getenv("GEOIP_CACHE_TTL", GEOIP_CACHE_TTL)),
+            prefix24=os.getenv("GEOIP_CACHE_PREFIX24", "").lower() in ("1", "true", "yes"),
+        )
+        _default_cache.prune()
+    return _default_cache
@@ -0,0 +1,139 @@
+import os
+import csv
+import sys
+import mmap
+import socket
+import struct
+import ipaddress
+
+GEOIP_DB_FILE = "geoip.bin"
+MAGIC = b"VXGEO1\x00\x00"
+HEADER = struct.Struct("<8sII")  # magic, jumlah range, offset tabel string
+RECORD = struct.Struct("<II2sI")  # ip awal, ip akhir, countryCode, offset org
+
+def ip_to_int(ip: str) -> int:
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+def _parse_row(row):
+    """Baris CSV: 'cidr,cc,org' atau 'ip_awal,ip_akhir,cc,org' (IP titik atau integer)."""
+    row = [c.strip() for c in row]
+    if "/" in row[0]:
+        net = ipaddress.ip_network(row[0], strict=False)
+        if net.version != 4:
+            return None
+        start, end = int(net.network_address), int(net.broadcast_address)
+        rest = row[1:]
+    else:
+        start, end = (int(c) if c.isdigit() else ip_to_int(c) for c in row[:2])
+        rest = row[2:]
+    country_code = (rest[0] if rest else "").upper()
+    org = rest[1] if len(rest) > 1 else ""
+    return start, end, country_code, org
+
+def build_database(csv_path: str, out_path: str) -> int:
+    """Ubah dump CSV range IP menjadi file biner terurut untuk OfflineGeoIP. Return jumlah range."""
+    ranges = []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                parsed = _parse_row(row)
+            except (ValueError, OSError):
+                continue  # header atau baris rusak
+            if parsed and len(parsed[2]) == 2:
+                ranges.append(parsed)
+    ranges.sort()
+
+    strings = bytearray()
+    string_offsets = {}
+    records = bytearray()
+    for start, end, country_code, org in ranges:
+        if org not in string_offsets:
+            encoded = org.encode("utf-8")[:0xFFFF]
+            string_offsets[org] = len(strings)
+            strings += struct.pack("<H", len(encoded)) + encoded
+        records += RECORD.pack(start, end, country_code.encode("ascii"), string_offsets[org])
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(ranges), HEADER.size + len(records)))
+        f.write(records)
+        f.write(strings)
+    os.replace(tmp_path, out_path)
+    return len(ranges)
+
+class OfflineGeoIP:
+    """Lookup GeoIP tanpa jaringan: binary search di atas file range yang di-mmap."""
+
+    def __init__(self, path=GEOIP_DB_FILE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.count, self._strings_offset = HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            magic = None
+        if magic != MAGIC or self._strings_offset != HEADER.size + self.count * RECORD.size \
+                or self._strings_offset > len(self._mm):
+            self._mm.close()
+            raise ValueError(f"'{path}' bukan database GeoIP offline atau rusak")
+
+    def _find(self, value: int):
+        lo, hi = 0, self.count - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            start, end, country_code, org_offset = RECORD.unpack_from(self._mm, HEADER.size + mid * RECORD.size)
+            if value < start:
+                hi = mid - 1
+            elif value > end:
+                lo = mid + 1
+            else:
+                return country_code, org_offset
+        return None
+
+    def lookup(self, ip: str) -> dict | None:
+        """Return entri berformat respons ip-api (status/countryCode/org), atau None jika tidak ada."""
+        try:
+            value = ip_to_int(ip)
+        except (OSError, TypeError):
+            return None
+        found = self._find(value)
+        if found is None:
+            return None
+        country_code, org_offset = found
+        pos = self._strings_offset + org_offset
+        (length,) = struct.unpack_from("<H", self._mm, pos)
+        org = self._mm[pos + 2:pos + 2 + length].decode("utf-8")
+        return {"status": "success", "countryCode": country_code.decode("ascii"), "org": org, "query": ip}
+
+    def close(self):
+        self._mm.close()
+
+_offline_db = None
+_offline_failed = False
+
+def get_offline_geoip() -> OfflineGeoIP | None:
+    """
+    Backend offline jika GEOIP_BACKEND=offline, selain itu None (pakai ip-api).
+    Database yang hilang atau rusak dilaporkan sekali, lalu lookup kembali ke ip-api.
+    """
+    global _offline_db, _offline_failed
+    if _offline_failed or os.getenv("GEOIP_BACKEND", "").lower() != "offline":
+        return None
+    if _offline_db is None:
+        path = os.getenv("GEOIP_DB", GEOIP_DB_FILE)
+        try:
+            _offline_db = OfflineGeoIP(path)
+        except (OSError, ValueError) as e:
+            _offline_failed = True
+            print(f"⚠️ Database GeoIP offline '{path}' tidak bisa dibuka ({e}); memakai ip-api.")
+            return None
+    return _offline_db
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("Pemakaian: python geoip_offline.py build <ranges.csv> <output.bin>")
+        sys.exit(1)
+    total = build_database(sys.argv[2], sys.argv[3])
+    print(f"✔️ {total} range IP ditulis ke '{sys.argv[3]}'.")
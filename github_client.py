@@ -1,24 +1,119 @@
+import os
+import io
 import requests
 import base64
 import json
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config_writer import copy_base64, SPOOL_LIMIT
+
+GITHUB_API_URL = "https://api.github.com"  # bisa diganti lewat env GITHUB_API_URL, mis. ke mock server
+POOL_SIZE = 10
+HTTP_RETRIES = 3
+RETRY_BACKOFF = 0.5
+BLOB_CACHE_SIZE = 8  # isi blob (immutable per sha) yang disimpan di memori
+COMMIT_RETRIES = 3  # percobaan ulang commit multi-file jika ref bergeser
+GIT_FILE_MODE = "100644"
+HASH_BLOCK = 64 * 1024
+
+def git_blob_sha(fp) -> str:
+    """sha blob Git (sha1 dari 'blob <ukuran>\\0' + isi) dari file biner, dibaca per blok."""
+    fp.seek(0, 2)
+    size = fp.tell()
+    fp.seek(0)
+    digest = hashlib.sha1(f"blob {size}\0".encode())
+    for block in iter(lambda: fp.read(HASH_BLOCK), b""):
+        digest.update(block)
+    fp.seek(0)
+    return digest.hexdigest()
 
 class GitHubClient:
-    def __init__(self, token: str, owner: str, repo: str):
+    def __init__(self, token: str, owner: str, repo: str, api_base: str = None):
         self.token = token
         self.owner = owner
         self.repo = repo
-        self.api_url = f"https://api.github.com/repos/{owner}/{repo}/contents"
+        self.api_base = (api_base or os.getenv("GITHUB_API_URL") or GITHUB_API_URL).rstrip("/")
+        self.repo_url = f"{self.api_base}/repos/{owner}/{repo}"
+        self.api_url = f"{self.repo_url}/contents"
         self.headers = {
             "Authorization": f"token {self.token}",
             "Accept": "application/vnd.github.v3+json"
         }
+        self.session = self._make_session()
+        self._lock = threading.Lock()
+        self._etags = {}  # url -> (ETag, JSON respons terakhir)
+        self._blobs = OrderedDict()  # sha -> isi file
+        self.stats = {"requests": 0, "not_modified": 0, "blobs": 0}
+
+    def _make_session(self) -> requests.Session:
+        """Session dengan pool keep-alive dan retry otomatis untuk GET yang gagal sementara."""
+        retry = Retry(
+            total=HTTP_RETRIES, backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}), raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        self.session.close()
+
+    def _get_json(self, url: str, timeout: float):
+        """
+        GET kondisional: ETag respons sebelumnya dikirim sebagai If-None-Match, dan
+        304 Not Modified dijawab dari cache (tidak memakan kuota rate limit GitHub).
+        """
+        with self._lock:
+            cached = self._etags.get(url)
+            self.stats["requests"] += 1
+        headers = {"If-None-Match": cached[0]} if cached else None
+        response = self.session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            return cached[1]
+        response.raise_for_status()
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            with self._lock:
+                self._etags[url] = (etag, data)
+        return data
+
+    def _get_blob(self, sha: str, timeout: float = 30) -> str:
+        """Isi file lewat Git blobs API (sampai 100 MB) dalam bentuk mentah, tanpa base64."""
+        with self._lock:
+            if sha in self._blobs:
+                self._blobs.move_to_end(sha)
+                return self._blobs[sha]
+            self.stats["requests"] += 1
+            self.stats["blobs"] += 1
+        response = self.session.get(
+            f"{self.repo_url}/git/blobs/{sha}",
+            headers={"Accept": "application/vnd.github.raw"}, timeout=timeout,
+        )
+        response.raise_for_status()
+        content = response.content.decode('utf-8')
+        with self._lock:
+            self._blobs[sha] = content
+            while len(self._blobs) > BLOB_CACHE_SIZE:
+                self._blobs.popitem(last=False)
+        return content
 
     def list_files_in_repo(self, path: str = "") -> list:
         url = f"{self.api_url}/{path}"
         try:
-            response = requests.get(url, headers=self.headers, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(url, timeout=30)
         except requests.exceptions.RequestException as e:
             print(f"❌ Gagal mengambil daftar file dari GitHub: {e}")
             return []
@@ -26,26 +121,182 @@ class GitHubClient:
     def get_file(self, file_path: str) -> tuple[str, str] | None:
         url = f"{self.api_url}/{file_path}"
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            content = base64.b64decode(data['content']).decode('utf-8')
+            data = self._get_json(url, timeout=10)
+            # Di atas 1 MB contents API tidak menyertakan isi (encoding "none"); ambil dari blob
+            if data.get('encoding') == 'base64' and data.get('content'):
+                content = base64.b64decode(data['content']).decode('utf-8')
+            else:
+                content = self._get_blob(data['sha'])
             return content, data['sha']
         except requests.exceptions.RequestException as e:
             print(f"❌ Gagal mengambil file '{file_path}': {e}")
             return None, None
 
-    def update_or_create_file(self, file_path: str, content: str, commit_message: str, sha: str = None):
+    def _build_body(self, fields: dict, content):
+        """
+        Body JSON `fields` + "content" base64 sebagai file sementara. content boleh str atau file
+        biner; file di-base64 per blok langsung ke body sehingga tidak ada salinan tambahan di memori.
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT, mode="w+b")
+        body.write(json.dumps(fields)[:-1].encode("utf-8") + b', "content": "')
+        if isinstance(content, str):
+            body.write(base64.b64encode(content.encode('utf-8')))
+        else:
+            copy_base64(content, body)
+        body.write(b'"}')
+        body.seek(0)
+        return body
+
+    @staticmethod
+    def _request_data(body):
+        """
+        Data untuk requests: body kecil dikirim sebagai bytes. File diberikan langsung hanya jika
+        sudah pindah ke disk, karena requests memanggil fileno() (untuk Content-Length) yang
+        memaksa SpooledTemporaryFile di memori ikut ditulis ke disk.
+        """
+        body.seek(0, 2)
+        size = body.tell()
+        body.seek(0)
+        return body.read() if size <= SPOOL_LIMIT else body
+
+    def update_or_create_file(self, file_path: str, content, commit_message: str, sha: str = None):
         url = f"{self.api_url}/{file_path}"
-        encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
-        payload = {"message": commit_message, "content": encoded_content}
+        headers = {"Content-Type": "application/json"}
+        fields = {"message": commit_message}
         if sha:
-            payload['sha'] = sha
+            fields["sha"] = sha
         try:
-            response = requests.put(url, headers=self.headers, data=json.dumps(payload), timeout=15)
+            with self._build_body(fields, content) as body:
+                response = self.session.put(url, headers=headers, data=self._request_data(body), timeout=60)
             response.raise_for_status()
+            with self._lock:
+                self._etags.pop(url, None)
+                self.stats["requests"] += 1
             print(f"✔️ Berhasil menyimpan file '{file_path}' ke GitHub.")
             return response.json()
         except requests.exceptions.RequestException as e:
             print(f"❌ Gagal menyimpan ke GitHub: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def _post_json(self, url: str, payload: dict, timeout: float = 30):
+        with self._lock:
+            self.stats["requests"] += 1
+        response = self.session.post(url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _default_branch(self) -> str:
+        return self._get_json(self.repo_url, timeout=10)["default_branch"]
+
+    def _tree_blob_shas(self, tree_sha: str) -> dict:
+        """{path: sha blob} seluruh isi tree (rekursif). Tree immutable, jadi cache ETag selalu valid."""
+        data = self._get_json(f"{self.repo_url}/git/trees/{tree_sha}?recursive=1", timeout=30)
+        return {e["path"]: e["sha"] for e in data.get("tree", []) if e.get("type") == "blob"}
+
+    def _create_blob(self, fp) -> str:
+        with self._lock:
+            self.stats["requests"] += 1
+        with self._build_body({"encoding": "base64"}, fp) as body:
+            response = self.session.post(
+                f"{self.repo_url}/git/blobs", headers={"Content-Type": "application/json"},
+                data=self._request_data(body), timeout=60,
+            )
+        response.raise_for_status()
+        return response.json()["sha"]
+
+    def commit_files(self, files: dict, commit_message: str, branch: str = None):
+        """
+        Commit banyak file sekaligus lewat Git Data API: blob untuk file yang berubah, satu tree,
+        satu commit, lalu ref branch dipindahkan (tanpa force). Jika ref bergeser di tengah jalan
+        (non fast-forward), tree dan commit dibangun ulang di atas head terbaru; blob dipakai ulang.
+
+        files: {path: str atau file biner}. Return {"commit": sha, "files": [path berubah]},
+        atau None jika gagal. Tanpa perubahan tidak ada commit yang dibuat.
+        """
+        streams = {
+            path: io.BytesIO(content.encode('utf-8')) if isinstance(content, str) else content
+            for path, content in files.items()
+        }
+        local_shas = {path: git_blob_sha(fp) for path, fp in streams.items()}
+        uploaded = set()
+        try:
+            branch = branch or self._default_branch()
+            for attempt in range(1, COMMIT_RETRIES + 1):
+                head = self._get_json(f"{self.repo_url}/git/ref/heads/{branch}", timeout=10)["object"]["sha"]
+                base_tree = self._get_json(f"{self.repo_url}/git/commits/{head}", timeout=10)["tree"]["sha"]
+                remote_shas = self._tree_blob_shas(base_tree)
+                changed = [path for path in streams if remote_shas.get(path) != local_shas[path]]
+                if not changed:
+                    print(f"✔️ Tidak ada perubahan pada {len(streams)} file; commit dilewati.")
+                    return {"commit": head, "files": []}
+
+                pending = [path for path in changed if path not in uploaded]
+                if pending:
+                    with ThreadPoolExecutor(max_workers=min(POOL_SIZE, len(pending))) as pool:
+                        shas = list(pool.map(lambda path: self._create_blob(streams[path]), pending))
+                    for path, sha in zip(pending, shas):
+                        local_shas[path] = sha
+                        uploaded.add(path)
+
+                tree = self._post_json(f"{self.repo_url}/git/trees", {
+                    "base_tree": base_tree,
+                    "tree": [
+                        {"path": path, "mode": GIT_FILE_MODE, "type": "blob", "sha": local_shas[path]}
+                        for path in changed
+                    ],
+                })
+                commit = self._post_json(f"{self.repo_url}/git/commits", {
+                    "message": commit_message, "tree": tree["sha"], "parents": [head],
+                })
+                with self._lock:
+                    self.stats["requests"] += 1
+                response = self.session.patch(
+                    f"{self.repo_url}/git/refs/heads/{branch}",
+                    json={"sha": commit["sha"], "force": False}, timeout=15,
+                )
+                if response.status_code in (409, 422):
+                    print(f"⚠️ Branch '{branch}' berubah saat commit, mengulang ({attempt}/{COMMIT_RETRIES})...")
+                    continue
+                response.raise_for_status()
+                print(f"✔️ Berhasil meng-commit {len(changed)} file ke GitHub dalam satu commit.")
+                return {"commit": commit["sha"], "files": changed}
+            print(f"❌ Gagal meng-commit: branch '{branch}' terus berubah.")
+            return None
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Gagal meng-commit ke GitHub: {e}")
+            return None
+
+    def summary(self) -> str:
+        return (
+            f"GitHub API: {self.stats['requests']} request, "
+            f"{self.stats['not_modified']} tidak berubah (304), {self.stats['blobs']} via blob"
+        )
+
+class AsyncGitHubClient:
+    """
+    Versi async GitHubClient: setiap panggilan dijalankan di worker thread sehingga
+    pengambilan dari GitHub bisa berjalan bersamaan dengan pekerjaan lain di event loop.
+    Session, cache ETag dan blob dipakai bersama dengan client sinkron di dalamnya.
+    """
+
+    def __init__(self, client: GitHubClient):
+        self.client = client
+
+    @property
+    def token(self):
+        return self.client.token
+
+    async def list_files_in_repo(self, path: str = "") -> list:
+        return await asyncio.to_thread(self.client.list_files_in_repo, path)
+
+    async def get_file(self, file_path: str):
+        return await asyncio.to_thread(self.client.get_file, file_path)
+
+    async def update_or_create_file(self, file_path: str, content, commit_message: str, sha: str = None):
+        return await asyncio.to_thread(self.client.update_or_create_file, file_path, content, commit_message, sha)
+
+    async def commit_files(self, files: dict, commit_message: str, branch: str = None):
+        return await asyncio.to_thread(self.client.commit_files, files, commit_message, branch)
+
+    def summary(self) -> str:
+        return self.client.summary()
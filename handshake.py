@@ -0,0 +1,147 @@
+import os
+import ssl
+import time
+import base64
+import hashlib
+import asyncio
+from urllib.parse import quote
+from fingerprint import parse_plugin_opts
+
+HANDSHAKE_TIMEOUT = 5  # detik, total connect + TLS + upgrade WebSocket
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_PATH_SAFE = "/?&=%:@-._~!$'()*+,;"
+
+class HandshakeError(Exception):
+    """Server menjawab, tetapi bukan dengan handshake yang diharapkan (mis. bukan 101)."""
+
+def _text(value) -> str:
+    # Opsi plugin tanpa nilai (mis. "tls") diparse sebagai True, bukan string
+    return value if isinstance(value, str) else ""
+
+def handshake_params(account: dict) -> dict | None:
+    """
+    Parameter handshake protokol sebuah outbound: server/port tujuan, TLS (SNI, insecure)
+    dan WebSocket (path, Host). None jika akun tidak punya TLS maupun WebSocket,
+    karena handshake-nya tidak memberi informasi lebih dari connect TCP biasa.
+    """
+    server = account.get("server")
+    try:
+        port = int(account.get("server_port") or 443)
+    except (TypeError, ValueError):
+        return None
+    if account.get("type") == "shadowsocks":
+        if account.get("plugin") != "v2ray-plugin":
+            return None
+        opts = parse_plugin_opts(account.get("plugin_opts"))
+        tls = "tls" in opts
+        host = _text(opts.get("host")) or server
+        sni = _text(opts.get("sni")) or host
+        insecure = False
+        ws = True  # v2ray-plugin selalu memakai transport websocket
+        path = _text(opts.get("path"))
+    else:
+        tls_opts = account.get("tls") if isinstance(account.get("tls"), dict) else {}
+        transport = account.get("transport") if isinstance(account.get("transport"), dict) else {}
+        headers = transport.get("headers") if isinstance(transport.get("headers"), dict) else {}
+        tls = bool(tls_opts.get("enabled"))
+        sni = tls_opts.get("server_name") or tls_opts.get("sni") or server
+        insecure = bool(tls_opts.get("insecure"))
+        ws = transport.get("type") == "ws"
+        host = headers.get("Host") or headers.get("host") or sni or server
+        path = transport.get("path") or ""
+    if not server or not (tls or ws):
+        return None
+    if not path.startswith("/"):
+        path = "/" + path
+    return {
+        "server": server, "port": port, "tls": tls, "sni": sni, "insecure": insecure,
+        "ws": ws, "host": host, "path": path,
+    }
+
+_contexts = {}
+
+def tls_context(insecure=False) -> ssl.SSLContext:
+    """SSLContext bersama (verifikasi sertifikat kecuali insecure), ALPN hanya http/1.1 untuk upgrade WS."""
+    context = _contexts.get(insecure)
+    if context is None:
+        context = ssl.create_default_context()
+        if insecure:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        context.set_alpn_protocols(["http/1.1"])
+        _contexts[insecure] = context
+    return context
+
+def _elapsed_ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+def _upgrade_request(params: dict, key: str) -> bytes:
+    path = quote(params["path"], safe=WS_PATH_SAFE)
+    return (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {params['host']}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n"
+        "User-Agent: Mozilla/5.0\r\n"
+        "\r\n"
+    ).encode("latin-1", errors="replace")
+
+def _check_upgrade(head: bytes, key: str):
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    parts = status_line.split(" ", 2)
+    if len(parts) < 2 or parts[1] != "101":
+        raise HandshakeError(f"HTTP {parts[1] if len(parts) > 1 else '?'}")
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    expected = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    if headers.get("sec-websocket-accept") != expected:
+        raise HandshakeError("Sec-WebSocket-Accept tidak cocok")
+
+async def _handshake(ip: str, params: dict, stages: dict, ssl_context):
+    writer = None
+    try:
+        started = time.perf_counter()
+        reader, writer = await asyncio.open_connection(ip, params["port"])
+        stages["connect"] = _elapsed_ms(started)
+        if params["tls"]:
+            started = time.perf_counter()
+            context = ssl_context or tls_context(params["insecure"])
+            await writer.start_tls(context, server_hostname=params["sni"])
+            stages["tls"] = _elapsed_ms(started)
+        if params["ws"]:
+            started = time.perf_counter()
+            key = base64.b64encode(os.urandom(16)).decode()
+            writer.write(_upgrade_request(params, key))
+            await writer.drain()
+            _check_upgrade(await reader.readuntil(b"\r\n\r\n"), key)
+            stages["ws"] = _elapsed_ms(started)
+    finally:
+        if writer is not None:
+            # abort, bukan close + wait_closed: setelah start_tls yang batal, wait_closed bisa menggantung
+            writer.transport.abort()
+
+async def handshake_probe(ip: str, params: dict, timeout=HANDSHAKE_TIMEOUT, ssl_context=None) -> dict:
+    """
+    Handshake nyata ke ip:params["port"]: connect TCP, TLS dengan SNI akun, lalu upgrade
+    WebSocket ke path/Host akun. Return {"ok", "connect", "tls", "ws", "error"}; durasi
+    tiap tahap dalam ms, -1 untuk tahap yang tidak dijalankan atau tidak selesai.
+    """
+    stages = {"ok": False, "connect": -1, "tls": -1, "ws": -1, "error": None}
+    try:
+        await asyncio.wait_for(_handshake(ip, params, stages, ssl_context), timeout=timeout)
+        stages["ok"] = True
+    except asyncio.TimeoutError:
+        stages["error"] = "timeout"
+    except ssl.SSLError as e:
+        stages["error"] = f"TLS: {e.reason or e}"
+    except HandshakeError as e:
+        stages["error"] = f"WS: {e}"
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        stages["error"] = "WS: respons tidak lengkap"
+    except (OSError, ValueError) as e:
+        stages["error"] = str(e) or type(e).__name__
+    return stages
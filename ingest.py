@@ -0,0 +1,143 @@
+import re
+import sys
+import base64
+import binascii
+import asyncio
+import threading
+from converter import parse_link, VPN_LINK_RE
+
+B64_LINE_RE = re.compile(r"[A-Za-z0-9+/_=-]{16,}")
+THREAD_BATCH = 256  # baris per perpindahan ke worker thread
+
+class Base64Stream:
+    """Decode body subscription base64 (boleh terpotong ke banyak baris) secara bertahap."""
+
+    def __init__(self):
+        self._text = ""
+        self._bytes = b""
+
+    def _decode(self, chunk: str) -> bytes:
+        chunk = chunk.replace("-", "+").replace("_", "/")
+        try:
+            return base64.b64decode(chunk)
+        except (binascii.Error, ValueError):
+            return b""
+
+    def _split(self, final=False):
+        *lines, self._bytes = self._bytes.split(b"\n")
+        if final and self._bytes:
+            lines.append(self._bytes)
+            self._bytes = b""
+        return [line.decode("utf-8", errors="replace") for line in lines]
+
+    def feed(self, chunk: str) -> list:
+        # Padding '=' menandai akhir satu blob base64
+        padded = chunk.endswith("=")
+        self._text += chunk.rstrip("=")
+        usable = len(self._text) // 4 * 4
+        if usable:
+            self._bytes += self._decode(self._text[:usable])
+            self._text = self._text[usable:]
+        lines = self._split()
+        if padded:
+            lines += self.finish()
+        return lines
+
+    def finish(self) -> list:
+        if self._text:
+            self._bytes += self._decode(self._text + "=" * (-len(self._text) % 4))
+            self._text = ""
+        return self._split(final=True)
+
+def iter_source_lines(paths):
+    """Baris dari file-file input; '-' berarti stdin. Dibaca bertahap, tidak sekaligus."""
+    for path in paths:
+        if path == "-":
+            yield from sys.stdin
+        else:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                yield from f
+
+def iter_links(lines):
+    """
+    Generator link VPN dari aliran baris. Baris/blok base64 (subscription) di-decode
+    transparan; link di dalamnya ikut dihasilkan tanpa menampung seluruh input.
+    """
+    decoder = None
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if "://" not in stripped and B64_LINE_RE.fullmatch(stripped):
+            decoder = decoder or Base64Stream()
+            for text in decoder.feed(stripped):
+                yield from VPN_LINK_RE.findall(text)
+            continue
+        if decoder is not None:
+            for text in decoder.finish():
+                yield from VPN_LINK_RE.findall(text)
+            decoder = None
+        yield from VPN_LINK_RE.findall(stripped)
+    if decoder is not None:
+        for text in decoder.finish():
+            yield from VPN_LINK_RE.findall(text)
+
+def iter_accounts(links, on_invalid=None):
+    """parse_link untuk setiap link; link tidak valid dilaporkan lewat on_invalid(link)."""
+    for link in links:
+        parsed = parse_link(link)
+        if parsed:
+            yield parsed
+        elif on_invalid is not None:
+            on_invalid(link)
+
+def _settle(future, result, error):
+    if not future.done():
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+def _in_daemon_thread(func) -> asyncio.Future:
+    """
+    Seperti asyncio.to_thread, tetapi di thread daemon: pembacaan yang menggantung
+    (mis. stdin yang tidak pernah ditutup) tidak menahan proses keluar setelah deadline.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def run():
+        result, error = None, None
+        try:
+            result = func()
+        except Exception as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(_settle, future, result, error)
+        except RuntimeError:
+            pass  # event loop sudah ditutup
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+async def iterate_in_thread(iterable, batch=THREAD_BATCH):
+    """
+    Async iterator di atas iterable blocking (file/stdin): item diambil per batch di
+    thread terpisah agar event loop tetap bebas untuk probing selama input dibaca.
+    """
+    iterator = iter(iterable)
+
+    def take():
+        items = []
+        for item in iterator:
+            items.append(item)
+            if len(items) >= batch:
+                break
+        return items
+
+    while True:
+        items = await _in_daemon_thread(take)
+        if not items:
+            return
+        for item in items:
+            yield item
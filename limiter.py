@@ -0,0 +1,128 @@
+import time
+import asyncio
+import statistics
+
+class AdaptiveLimiter:
+    """
+    Pengganti asyncio.Semaphore dengan batas in-flight yang menyesuaikan diri (AIMD).
+    Dipakai dengan `async with limiter:`; probe melaporkan hasil lewat record().
+
+    Setiap `window` sampel dievaluasi:
+    - kongesti (median latency connect > latency_factor x baseline, lonjakan rasio
+      timeout di atas rata-rata historis + timeout_margin, rasio timeout di atas
+      max_timeout_rate, atau ada timeout tanpa satu pun connect sukses) -> limit dikali decrease;
+    - selain itu limit naik: dua kali lipat selama slow start, lalu +increase.
+    Limit selalu dijaga di antara floor dan ceiling.
+    """
+
+    def __init__(self, initial=50, floor=10, ceiling=500, increase=5, decrease=0.7,
+                 latency_factor=2.0, timeout_margin=0.15, max_timeout_rate=0.5, min_window=20):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.timeout_margin = timeout_margin
+        self.max_timeout_rate = max_timeout_rate
+        self.min_window = min_window
+        self._limit = float(min(max(initial, floor), ceiling))
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+        self._slow_start = True
+        self._latencies = []
+        self._timeouts = 0
+        self._samples = 0
+        self._baseline_latency = None
+        self._timeout_rate = None  # EWMA rasio timeout per window
+        self.stats = {"increases": 0, "decreases": 0, "peak": int(self._limit), "acquired": 0}
+        self._busy = 0.0  # detik-slot terpakai (integral in_flight terhadap waktu)
+        self._changed = time.monotonic()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._account_busy()
+            self._in_flight += 1
+            self.stats["acquired"] += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._cond:
+            self._account_busy()
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def _account_busy(self):
+        now = time.monotonic()
+        self._busy += self._in_flight * (now - self._changed)
+        self._changed = now
+
+    @property
+    def slot_seconds(self) -> float:
+        """Total waktu slot dipegang (detik-slot) sejak limiter dibuat."""
+        return self._busy + self._in_flight * (time.monotonic() - self._changed)
+
+    def record(self, latency_ms=None, timed_out=False):
+        """Laporkan satu percobaan connect: latency (ms) jika sukses, timed_out jika habis waktu."""
+        self._samples += 1
+        if timed_out:
+            self._timeouts += 1
+        elif latency_ms is not None and latency_ms >= 0:
+            self._latencies.append(latency_ms)
+        if self._samples >= max(self.min_window, self.limit):
+            self._evaluate()
+
+    def _evaluate(self):
+        timeout_rate = self._timeouts / self._samples
+        median_latency = statistics.median(self._latencies) if self._latencies else None
+        congested = False
+        if median_latency is not None:
+            if self._baseline_latency is None or median_latency < self._baseline_latency:
+                self._baseline_latency = median_latency
+            elif median_latency > max(self._baseline_latency, 1) * self.latency_factor:
+                congested = True
+            else:
+                # baseline boleh naik perlahan agar tidak terkunci pada satu window yang kebetulan cepat
+                self._baseline_latency = 0.95 * self._baseline_latency + 0.05 * median_latency
+        if self._timeout_rate is not None and timeout_rate > self._timeout_rate + self.timeout_margin:
+            congested = True
+        # Timeout yang tetap tinggi juga kongesti: EWMA ikut naik sehingga lonjakan saja tidak terdeteksi
+        if timeout_rate > self.max_timeout_rate or (self._timeouts and median_latency is None):
+            congested = True
+        self._timeout_rate = timeout_rate if self._timeout_rate is None else 0.8 * self._timeout_rate + 0.2 * timeout_rate
+
+        old_limit = self.limit
+        if congested:
+            self._slow_start = False
+            self._limit = max(self.floor, self._limit * self.decrease)
+            self.stats["decreases"] += 1
+        else:
+            self._limit = min(self.ceiling, self._limit * 2 if self._slow_start else self._limit + self.increase)
+            self.stats["increases"] += 1
+        self.stats["peak"] = max(self.stats["peak"], self.limit)
+        self._latencies.clear()
+        self._timeouts = 0
+        self._samples = 0
+        if self.limit > old_limit:
+            asyncio.ensure_future(self._wake())
+
+    async def _wake(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    def summary(self) -> str:
+        acquired = self.stats["acquired"]
+        per_slot = self.slot_seconds / acquired * 1000 if acquired else 0
+        return (
+            f"Konkurensi adaptif: limit {self.limit} (puncak {self.stats['peak']}, "
+            f"batas {self.floor}-{self.ceiling}), {self.stats['increases']} naik, {self.stats['decreases']} turun, "
+            f"{acquired} slot dipakai (rata-rata {per_slot:.0f} ms per slot)"
+        )
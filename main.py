@@ -1,23 +1,38 @@
 import os
 import json
-import re
 import asyncio
+import heapq
 from datetime import datetime
 from rich.table import Table
 from rich.console import Console
 from rich.live import Live
 from dotenv import load_dotenv
 
-from github_client import GitHubClient
+from github_client import GitHubClient, AsyncGitHubClient
 from core import (
-    deduplicate_accounts, sort_priority, ensure_ws_path_field,
+    deduplicate_accounts, ensure_ws_path_field,
     build_final_accounts, load_template, test_all_accounts
 )
 from extractor import extract_accounts_from_config
 from converter import parse_link, inject_outbounds_to_template
+from ingest import iter_links
+from resolver import default_resolver
+from geoip_cache import get_geoip_cache
+from geoip_batch import get_geoip_batcher
+from geoip_offline import get_offline_geoip
+from limiter import AdaptiveLimiter
+from result_cache import open_result_cache
+from metrics import get_metrics
+from ranking import Ranker, TOP_K_PER_REGION
+from config_writer import save_config, spool_config
 
-MAX_CONCURRENT_TESTS = 5
+MIN_CONCURRENT_TESTS = 10
+INITIAL_CONCURRENT_TESTS = 50
+MAX_CONCURRENT_TESTS = 500
+RUN_DEADLINE = 15 * 60  # detik, batas waktu total pengetesan
 TEMPLATE_FILE = "template.json"
+TABLE_WINDOW = 30  # baris maksimum di tabel live
+RENDER_FPS = 6
 SPINNERS = ["◐", "◓", "◑", "◒"]
 DOTS = ["⠁", "⠂", "⠄", "⠂"]
 
@@ -26,18 +41,19 @@ def get_user_vpn_links():
     console.print(
         "\n[bold cyan]Paste akun baru (jika ada). Ketik 'selesai' di baris baru jika sudah.[/bold cyan]"
     )
-    lines = []
-    while True:
-        try:
-            line = input()
-        except EOFError:
-            break
-        if line.strip().lower() == "selesai":
-            break
-        lines.append(line)
-    full_text = "\n".join(lines)
-    vpn_pattern = r"(?:vless|vmess|trojan|ss)://[^\s]+"
-    found_links = re.findall(vpn_pattern, full_text)
+
+    def pasted_lines():
+        while True:
+            try:
+                line = input()
+            except EOFError:
+                return
+            if line.strip().lower() == "selesai":
+                return
+            yield line
+
+    # Link langsung maupun body subscription base64 yang di-paste
+    found_links = list(iter_links(pasted_lines()))
     if found_links:
         console.print(
             f"✔️ Ditemukan {len(found_links)} link VPN baru.", style="bold green"
@@ -50,8 +66,38 @@ def get_spinner(frame):
 def get_dots(frame):
     return "." * ((frame % 4) + 1)
 
-def generate_table(test_results, frame=0):
-    table = Table(title="Hasil Tes Jaringan VPN")
+def status_counts(test_results) -> dict:
+    counts = {"waiting": 0, "testing": 0, "ok": 0, "failed": 0}
+    for res in test_results:
+        status = res.get("Status", "")
+        if status == "WAIT":
+            counts["waiting"] += 1
+        elif status == "●":
+            counts["ok"] += 1
+        elif status.startswith("✖"):
+            counts["failed"] += 1
+        else:
+            counts["testing"] += 1
+    return counts
+
+def visible_rows(test_results, window):
+    """Baris yang sedang dites/retry dan yang sukses tercepat, dibagi rata; maksimal `window` baris."""
+    active = []
+    finished = []
+    for res in test_results:
+        status = res.get("Status", "")
+        if status.startswith("Testing...") or status.startswith("Retry("):
+            if len(active) < window:
+                active.append(res)
+        elif status == "●":
+            finished.append(res)
+    best = heapq.nsmallest(window, finished, key=lambda r: r.get("Latency", -1))
+    n_active = min(len(active), max(window // 2, window - len(best)))
+    return active[:n_active] + best[:window - n_active]
+
+def generate_table(test_results, frame=0, window=None, caption=None):
+    """window=None menampilkan semua baris; jika diisi, hanya tampilan berjendela + ringkasan."""
+    table = Table(title="Hasil Tes Jaringan VPN", caption=caption)
     table.add_column("No", justify="right", style="dim")
     table.add_column("Type", justify="center", style="bold yellow")
     table.add_column("Country", justify="center")
@@ -62,7 +108,17 @@ def generate_table(test_results, frame=0):
     table.add_column("ICMP", justify="center", style="green")
     table.add_column("Status", justify="center")
 
-    for i, res in enumerate(test_results):
+    rows = test_results
+    if window is not None:
+        counts = status_counts(test_results)
+        table.caption = (
+            f"Waiting {counts['waiting']} | Testing {counts['testing']} | "
+            f"OK {counts['ok']} | Gagal {counts['failed']} | Total {len(test_results)}"
+            + (f" | {caption}" if caption else "")
+        )
+        rows = visible_rows(test_results, window)
+
+    for i, res in enumerate(rows):
         status = res.get("Status", "")
         retry = res.get("Retry", 0)
         is_waiting = status == "WAIT"
@@ -106,7 +162,7 @@ def generate_table(test_results, frame=0):
             status_disp = "[grey62]Unknown[/]"
 
         table.add_row(
-            str(i + 1),
+            str((res.get("index", i) if window is not None else i) + 1),
             res.get("VpnType", "N/A").upper(),
             country_disp,
             provider_disp,
@@ -118,14 +174,29 @@ def generate_table(test_results, frame=0):
         )
     return table
 
-def get_source_config(github_client):
+def ask_top_k() -> int:
+    answer = input(f"Simpan berapa akun terbaik per negara? (Enter = {TOP_K_PER_REGION}, 0 = semua): ").strip()
+    if not answer:
+        return TOP_K_PER_REGION
+    try:
+        return max(int(answer), 0)
+    except ValueError:
+        print(f"Input tidak valid, memakai {TOP_K_PER_REGION}.")
+        return TOP_K_PER_REGION
+
+async def get_source_config(github_client, files_task=None):
     console = Console()
     console.print("\n[bold cyan]Pilih sumber konfigurasi awal:[/bold cyan]")
     console.print("1. Buat config baru dari `template.json` lokal")
     console.print("2. Ambil dan tes ulang config dari GitHub")
     choice = input("Pilihan (1/2): ")
-    if choice == "2" and github_client and github_client.token:
-        files = github_client.list_files_in_repo()
+    from_github = choice == "2" and github_client and github_client.token
+    if files_task and not from_github:
+        # Daftar file tidak dipakai; jangan biarkan task (dan kemungkinan errornya) menggantung
+        files_task.cancel()
+        await asyncio.gather(files_task, return_exceptions=True)
+    if from_github:
+        files = await files_task if files_task else await github_client.list_files_in_repo()
         json_files = [
             f for f in files if f["type"] == "file" and f["name"].endswith(".json")
         ]
@@ -142,7 +213,7 @@ def get_source_config(github_client):
                 if 0 <= file_choice < len(json_files):
                     selected_file = json_files[file_choice]
                     console.print(f"Mengambil '{selected_file['name']}'...")
-                    content, sha = github_client.get_file(selected_file["path"])
+                    content, sha = await github_client.get_file(selected_file["path"])
                 if content:
                     return json.loads(content), selected_file["path"], sha
             except (ValueError, IndexError):
@@ -151,7 +222,7 @@ def get_source_config(github_client):
     with open(TEMPLATE_FILE, "r") as f:
         return json.load(f), None, None
 
-def perform_final_action(config_str, github_client, github_path, sha):
+def perform_final_action(config, github_client, github_path, sha):
     console = Console()
     timestamp = datetime.now().strftime("%Y%m%d-%H%M")
     new_filename = f"VortexVpn-{timestamp}.json"
@@ -162,8 +233,7 @@ def perform_final_action(config_str, github_client, github_path, sha):
         console.print("3. Keluar")
         choice = input("Pilihan (1/2/3): ")
         if choice == "1":
-            with open(new_filename, "w", encoding="utf-8") as f:
-                f.write(config_str)
+            save_config(config, new_filename)
             console.print(
                 f"✔️ Konfigurasi disimpan sebagai '{new_filename}'", style="bold green"
             )
@@ -174,9 +244,8 @@ def perform_final_action(config_str, github_client, github_path, sha):
             commit_msg = input("Masukkan pesan commit: ")
             upload_path = github_path if github_path else new_filename
             console.print(f"Mengunggah ke '{upload_path}' di GitHub...")
-            github_client.update_or_create_file(
-                upload_path, config_str, commit_msg, sha
-            )
+            with spool_config(config) as body:
+                github_client.update_or_create_file(upload_path, body, commit_msg, sha)
         elif choice == "3":
             break
 
@@ -184,16 +253,27 @@ async def main():
     console = Console()
     console.print("[bold green]--- Manajer Konfigurasi VortexVpn ---[/bold green]")
     load_dotenv()
+    get_offline_geoip()  # database offline yang rusak dilaporkan sekarang, bukan di tengah pengetesan
     github_token = os.getenv("GITHUB_TOKEN")
     if not github_token:
         print("tidak ada token")
     repo_owner = input("Masukkan Nama Pengguna/Owner Repo GitHub: ")
     repo_name = input("Masukkan Nama Repositori GitHub: ")
     github_client = (
-        GitHubClient(github_token, repo_owner, repo_name) if github_token else None
+        AsyncGitHubClient(GitHubClient(github_token, repo_owner, repo_name)) if github_token else None
     )
+    files_task = None
+    if github_client:
+        # Daftar file diambil di latar belakang selama pengguna memilih sumber config
+        files_task = asyncio.ensure_future(github_client.list_files_in_repo())
+        await asyncio.sleep(0)
 
-    source_config, github_path, sha = get_source_config(github_client)
+    source_config, github_path, sha = await get_source_config(github_client, files_task)
+    force_refresh = False
+    if github_path:
+        force_refresh = input("Paksa tes ulang semua akun (abaikan cache hasil)? (y/N): ").strip().lower() == "y"
+    handshake = input("Tes handshake TLS/WebSocket (lebih akurat, lebih lambat)? (y/N): ").strip().lower() == "y"
+    top_k = ask_top_k()
     existing_accounts = extract_accounts_from_config(source_config)
     existing_accounts = ensure_ws_path_field(existing_accounts)
 
@@ -223,7 +303,9 @@ async def main():
     console.print(
         f"\n[bold]Memulai pengetesan untuk {len(all_accounts)} akun unik...[/bold]"
     )
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TESTS)
+    limiter = AdaptiveLimiter(
+        initial=INITIAL_CONCURRENT_TESTS, floor=MIN_CONCURRENT_TESTS, ceiling=MAX_CONCURRENT_TESTS
+    )
 
     live_results = [
         {
@@ -242,25 +324,60 @@ async def main():
         for i, acc in enumerate(all_accounts)
     ]
 
-    with Live(
-        generate_table(live_results, 0), refresh_per_second=6, screen=True
-    ) as live:
-        frame = 0
-        results = await test_all_accounts(all_accounts, semaphore, live_results)
-        for res in results:
-            frame += 1
-            live.update(generate_table(live_results, frame))
+    result_cache = open_result_cache()
+    metrics = get_metrics()
+    metrics.reset()
+    ranker = Ranker(top_k=top_k)
+
+    def render(frame):
+        return generate_table(
+            live_results, frame, window=TABLE_WINDOW, caption=f"Konkurensi {limiter.limit}"
+        )
+
+    # Render berjalan dengan timer sendiri, terpisah dari datangnya hasil probe
+    test_task = asyncio.ensure_future(
+        test_all_accounts(
+            all_accounts, limiter, live_results, RUN_DEADLINE,
+            result_cache=result_cache, force_refresh=force_refresh, handshake=handshake,
+            on_result=ranker.offer,
+        )
+    )
+    try:
+        with Live(render(0), auto_refresh=False, screen=True) as live:
+            frame = 0
+            while not test_task.done():
+                await asyncio.wait({test_task}, timeout=1 / RENDER_FPS)
+                frame += 1
+                with metrics.timer("render"):
+                    live.update(render(frame), refresh=True)
+            test_task.result()
+    finally:
+        # Juga saat pengetesan gagal atau dihentikan pengguna: probe dibatalkan dulu, baru cache ditutup
+        if not test_task.done():
+            test_task.cancel()
+            await asyncio.gather(test_task, return_exceptions=True)
+        result_cache.close()
 
-    successful_accounts = [res for res in live_results if res["Status"] == "●"]
+    console.print(result_cache.summary(), style="dim")
+    console.print(limiter.summary(), style="dim")
+    console.print(default_resolver.summary(), style="dim")
+    console.print(get_geoip_cache().summary(), style="dim")
+    console.print(get_geoip_batcher().summary(), style="dim")
+    console.print(metrics.summary(), style="dim")
+    metrics_file = os.getenv("METRICS_FILE")
+    if metrics_file:
+        metrics.save(metrics_file)
+        console.print(f"Metrik disimpan ke '{metrics_file}'", style="dim")
+    console.print(ranker.summary(), style="dim")
+    successful_accounts = ranker.ranked()
 
     if not successful_accounts:
         console.print("\nTidak ada akun yang berhasil lolos tes.", style="bold red")
         return
 
-    successful_accounts.sort(key=sort_priority)
     final_accounts_to_inject = build_final_accounts(successful_accounts)
 
-    console.print("\n--- HASIL AKHIR PENGETESAN (Prioritas Negara & Tag Bersih) ---")
+    console.print("\n--- HASIL AKHIR PENGETESAN (Ranking Negara & Kualitas, Tag Bersih) ---")
     console.print(generate_table(successful_accounts))
 
     console.print("\n[bold]Membangun file konfigurasi akhir dari template.json lokal...[/bold]")
@@ -273,9 +390,10 @@ async def main():
     final_config_data = inject_outbounds_to_template(
         fresh_template_data, final_accounts_to_inject
     )
-    final_config_str = json.dumps(final_config_data, indent=2, ensure_ascii=False)
 
-    perform_final_action(final_config_str, github_client, github_path, sha)
+    perform_final_action(
+        final_config_data, github_client.client if github_client else None, github_path, sha
+    )
     console.print("\n[bold green]Terima kasih![/bold green]")
 
 if __name__ == "__main__":
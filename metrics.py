@@ -0,0 +1,165 @@
+import json
+import time
+from bisect import bisect_left
+
+# Batas atas bucket histogram (detik), skala log; bucket terakhir (+Inf) implisit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_PREFIX = "vortexvpn"
+TOTAL_PHASES = ("probe", "account")  # fase agregat (mencakup fase lain), tidak ikut diranking di summary
+
+class Histogram:
+    """Histogram bucket tetap: observe() hanya bisect + beberapa penjumlahan."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Perkiraan kuantil dengan interpolasi linear di dalam bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "buckets": {str(b): n for b, n in zip(BUCKETS + ("+Inf",), self.counts)},
+        }
+
+class _Timer:
+    __slots__ = ("metrics", "phase", "started")
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.phase, time.perf_counter() - self.started)
+
+class Metrics:
+    """
+    Durasi per fase (histogram) dan counter kejadian selama satu run pengetesan.
+    Fase: dns, slot_wait, tcp_connect, ping, geoip, retry_sleep, probe, account, render.
+    Diekspor sebagai JSON (to_json) atau format teks Prometheus (to_prometheus).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, phase: str, seconds: float):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.observe(seconds)
+
+    def timer(self, phase: str) -> _Timer:
+        """`with metrics.timer("dns"): ...` mencatat durasi blok ke histogram fase tersebut."""
+        return _Timer(self, phase)
+
+    def inc(self, event: str, n: int = 1):
+        self.counters[event] = self.counters.get(event, 0) + n
+
+    def state(self) -> dict:
+        """Isi mentah (bucket, counter) untuk digabung ke Metrics di proses lain lewat merge()."""
+        return {
+            "phases": {name: (h.counts, h.count, h.sum, h.max) for name, h in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+    def merge(self, state: dict):
+        for name, (counts, count, total, peak) in state["phases"].items():
+            histogram = self.phases.get(name)
+            if histogram is None:
+                histogram = self.phases[name] = Histogram()
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.count += count
+            histogram.sum += total
+            histogram.max = max(histogram.max, peak)
+        for event, n in state["counters"].items():
+            self.inc(event, n)
+
+    def to_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "duration": round(time.time() - self.started, 3),
+            "phases": {name: h.to_dict() for name, h in sorted(self.phases.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = METRICS_PREFIX) -> str:
+        lines = [
+            f"# HELP {prefix}_phase_seconds Durasi per fase pengetesan akun.",
+            f"# TYPE {prefix}_phase_seconds histogram",
+        ]
+        for name, h in sorted(self.phases.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), h.counts):
+                cumulative += n
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{name}"}} {h.sum:.6f}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{name}"}} {h.count}')
+        lines += [
+            f"# HELP {prefix}_events_total Jumlah kejadian selama run (percobaan, retry, timeout, cache).",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, n in sorted(self.counters.items()):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {n}')
+        lines += [
+            f"# HELP {prefix}_run_seconds Lama run sejak metrik di-reset.",
+            f"# TYPE {prefix}_run_seconds gauge",
+            f"{prefix}_run_seconds {time.time() - self.started:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def save(self, path: str):
+        """Tulis metrik ke path: format Prometheus jika berakhiran .prom/.txt, selain itu JSON."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def summary(self, top: int = 4) -> str:
+        phases = [(name, h) for name, h in self.phases.items() if name not in TOTAL_PHASES]
+        busiest = sorted(phases, key=lambda item: item[1].sum, reverse=True)[:top]
+        phases = ", ".join(f"{name} {h.sum:.1f}s (p90 {h.quantile(0.9) * 1000:.0f} ms)" for name, h in busiest)
+        return f"Metrik fase: {phases or '-'}"
+
+_default_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    return _default_metrics
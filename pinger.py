@@ -0,0 +1,149 @@
+import asyncio
+import socket
+import struct
+import statistics
+import time
+from utils import parse_ping_output
+
+PING_COUNT = 4
+PING_INTERVAL = 0.2  # detik antar echo ke host yang sama
+PING_TIMEOUT = 1.0  # detik menunggu balasan tiap echo
+PING_FAILED = {"Latency": -1, "Jitter": -1, "ICMP": "Failed"}
+
+def icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def build_echo(ident: int, seq: int, payload: bytes = b"vortexvpn-ping") -> bytes:
+    header = struct.pack("!BBHHH", 8, 0, 0, ident, seq)
+    checksum = icmp_checksum(header + payload)
+    return struct.pack("!BBHHH", 8, 0, checksum, ident, seq) + payload
+
+def summarize_latencies(latencies: list, count: int) -> dict:
+    """Bentuk dict yang sama dengan utils.get_network_stats dari daftar RTT (ms)."""
+    if not latencies:
+        return dict(PING_FAILED)
+    jitters = [abs(latencies[i] - latencies[i-1]) for i in range(1, len(latencies))]
+    return {
+        "Latency": round(statistics.mean(latencies)),
+        "Jitter": round(statistics.mean(jitters)) if jitters else 0,
+        "ICMP": "✔" if len(latencies) == count else f"{len(latencies)}/{count}",
+    }
+
+class ICMPPinger:
+    """
+    Pinger in-process untuk banyak host sekaligus di atas satu socket ICMP datagram
+    (unprivileged, Linux: net.ipv4.ping_group_range). Balasan dicocokkan lewat id/seq.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        self.sock.setblocking(False)
+        self.sock.bind(("0.0.0.0", 0))
+        # Untuk socket ping, kernel memakai "port" lokal sebagai identifier ICMP
+        self.ident = self.sock.getsockname()[1]
+        self._seq = 0
+        self._waiting = {}  # seq -> (host, Future)
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def _next_seq(self) -> int:
+        for _ in range(0x10000):
+            self._seq = (self._seq + 1) & 0xFFFF
+            if self._seq not in self._waiting:
+                return self._seq
+        raise OSError("Semua nomor seq ICMP sedang dipakai")
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack_from("!BBHHH", data)
+            if icmp_type != 0 or ident != self.ident:
+                continue
+            waiting = self._waiting.get(seq)
+            if waiting and waiting[0] == addr[0] and not waiting[1].done():
+                waiting[1].set_result(time.perf_counter())
+
+    async def _echo(self, host: str, timeout: float) -> float | None:
+        seq = self._next_seq()
+        future = self.loop.create_future()
+        self._waiting[seq] = (host, future)
+        try:
+            sent_at = time.perf_counter()
+            self.sock.sendto(build_echo(self.ident, seq), (host, 0))
+            received_at = await asyncio.wait_for(future, timeout=timeout)
+            return (received_at - sent_at) * 1000
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self._waiting.pop(seq, None)
+
+    async def ping(self, host: str, count=PING_COUNT, interval=PING_INTERVAL, timeout=PING_TIMEOUT) -> dict:
+        echoes = []
+        for i in range(count):
+            if i:
+                await asyncio.sleep(interval)
+            echoes.append(asyncio.ensure_future(self._echo(host, timeout)))
+        latencies = [rtt for rtt in await asyncio.gather(*echoes) if rtt is not None]
+        return summarize_latencies(latencies, count)
+
+    async def ping_many(self, hosts, **kwargs) -> dict:
+        hosts = list(dict.fromkeys(hosts))
+        results = await asyncio.gather(*(self.ping(h, **kwargs) for h in hosts))
+        return dict(zip(hosts, results))
+
+    def close(self):
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+async def subprocess_ping(host: str, count=PING_COUNT, interval=PING_INTERVAL) -> dict:
+    """Fallback jika socket ICMP tidak diizinkan: `ping` sebagai subprocess async."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "ping", "-c", str(count), "-i", str(interval), host,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+    except (FileNotFoundError, PermissionError):
+        return dict(PING_FAILED)
+    try:
+        output, _ = await asyncio.wait_for(proc.communicate(), timeout=5)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return dict(PING_FAILED)
+    return parse_ping_output(output.decode(errors="replace"), count)
+
+_pinger = None
+_icmp_unavailable = False
+
+def get_pinger() -> ICMPPinger | None:
+    """Pinger bersama untuk event loop aktif; None jika socket ICMP tidak tersedia."""
+    global _pinger, _icmp_unavailable
+    if _icmp_unavailable:
+        return None
+    if _pinger is None or _pinger.loop is not asyncio.get_running_loop():
+        if _pinger is not None:
+            _pinger.sock.close()  # milik event loop lama
+        try:
+            _pinger = ICMPPinger()
+        except OSError:
+            _icmp_unavailable = True
+            return None
+    return _pinger
+
+async def ping_host(host: str, count=PING_COUNT) -> dict:
+    pinger = get_pinger()
+    if pinger is None:
+        return await subprocess_ping(host, count)
+    return await pinger.ping(host, count)
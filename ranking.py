@@ -0,0 +1,77 @@
+import heapq
+import itertools
+from utils import get_country_code
+
+REGION_PREFERENCE = ("ID", "SG", "JP", "KR", "US")  # urutan prioritas negara
+REGION_PENALTY = 40  # ms skor tambahan per langkah turun di daftar preferensi
+OTHER_REGION_PENALTY = 250  # ms skor tambahan untuk negara di luar daftar
+JITTER_WEIGHT = 2.0  # ms skor per ms jitter
+LOSS_WEIGHT = 5.0  # ms skor per persen sampel connect yang gagal
+TOP_K_PER_REGION = 10  # akun terbaik yang disimpan per negara; 0 = semua
+UNKNOWN_REGION = "??"  # negara tidak diketahui (GeoIP gagal/terkena rate limit); tidak dibatasi top_k
+
+def parse_regions(value: str) -> tuple:
+    """'id, sg,JP' -> ('ID', 'SG', 'JP')."""
+    return tuple(code.strip().upper() for code in value.split(",") if code.strip())
+
+class Ranker:
+    """
+    Seleksi akun terbaik secara streaming. Skor (lebih kecil lebih baik) =
+    latency + JITTER_WEIGHT x jitter + LOSS_WEIGHT x loss% + penalti region.
+    offer() dipanggil untuk setiap hasil yang datang; per negara hanya top_k skor
+    terbaik yang disimpan dalam heap berukuran k, jadi total O(n log k). Hasil tanpa
+    negara tidak dibatasi: saat GeoIP gagal semua akun jatuh ke sana dan config tidak
+    boleh menyusut menjadi k akun.
+    """
+
+    def __init__(self, top_k=TOP_K_PER_REGION, preference=REGION_PREFERENCE, region_penalty=REGION_PENALTY,
+                 other_penalty=OTHER_REGION_PENALTY, jitter_weight=JITTER_WEIGHT, loss_weight=LOSS_WEIGHT):
+        self.top_k = top_k
+        self.preference = {code: rank for rank, code in enumerate(preference)}
+        self.region_penalty = region_penalty
+        self.other_penalty = other_penalty
+        self.jitter_weight = jitter_weight
+        self.loss_weight = loss_weight
+        self._heaps = {}  # region -> heap (-skor, -urutan, hasil); akar = kandidat terburuk
+        self._order = itertools.count()
+        self.offered = 0
+
+    def region(self, result: dict) -> str:
+        return get_country_code(result.get("Country")) or UNKNOWN_REGION
+
+    def score(self, result: dict) -> float:
+        rank = self.preference.get(self.region(result))
+        penalty = self.other_penalty if rank is None else rank * self.region_penalty
+        latency = result.get("Latency", -1)
+        if not isinstance(latency, (int, float)) or latency < 0:
+            return float("inf")
+        jitter = max(result.get("Jitter") or 0, 0)
+        loss = max(result.get("Loss") or 0, 0)
+        return latency + self.jitter_weight * jitter + self.loss_weight * loss + penalty
+
+    def offer(self, result: dict):
+        """Masukkan satu hasil tes; hanya hasil sukses (●) yang ikut diranking."""
+        if result.get("Status") != "●":
+            return
+        self.offered += 1
+        region = self.region(result)
+        heap = self._heaps.setdefault(region, [])
+        # Skor sama: yang datang lebih dulu dipertahankan
+        entry = (-self.score(result), -next(self._order), result)
+        if not self.top_k or region == UNKNOWN_REGION or len(heap) < self.top_k:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heappushpop(heap, entry)
+
+    def ranked(self) -> list:
+        """Hasil terpilih dari semua negara, urut skor terbaik lebih dulu."""
+        entries = [entry for heap in self._heaps.values() for entry in heap]
+        entries.sort(key=lambda entry: (-entry[0], -entry[1]))
+        return [entry[2] for entry in entries]
+
+    def __len__(self) -> int:
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def summary(self) -> str:
+        limit = f"top-{self.top_k} per negara" if self.top_k else "tanpa batas"
+        return f"Ranking: {len(self)}/{self.offered} akun lolos dipilih ({limit}, {len(self._heaps)} negara)"
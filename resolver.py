@@ -0,0 +1,179 @@
+import asyncio
+import random
+import socket
+import struct
+import time
+
+DNS_TTL = 300  # detik, cache jawaban positif
+DNS_NEGATIVE_TTL = 60  # detik, cache NXDOMAIN / gagal resolve
+DNS_TIMEOUT = 3  # detik per query
+
+class NXDomain(Exception):
+    """Nama tidak ada (rcode 3) atau tidak punya record A."""
+
+def is_ipv4(value) -> bool:
+    try:
+        socket.inet_aton(value)
+        return True
+    except (OSError, TypeError):
+        return False
+
+def build_query(name: str, query_id: int) -> bytes:
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(
+        bytes([len(label)]) + label for label in (p.encode("idna") for p in name.rstrip(".").split("."))
+    ) + b"\x00"
+    return header + qname + struct.pack("!HH", 1, 1)  # QTYPE=A, QCLASS=IN
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:  # pointer kompresi
+            return offset + 2
+        offset += 1
+        if length == 0:
+            return offset
+        offset += length
+
+def parse_response(data: bytes, query_id: int) -> tuple[str, int]:
+    """Kembalikan (ip, ttl) dari record A pertama. Raise NXDomain jika tidak ada."""
+    resp_id, flags, qdcount, ancount, _, _ = struct.unpack_from("!HHHHHH", data, 0)
+    if resp_id != query_id:
+        raise ValueError("ID respons DNS tidak cocok")
+    rcode = flags & 0x000F
+    if rcode == 3:
+        raise NXDomain()
+    if rcode != 0:
+        raise OSError(f"DNS rcode {rcode}")
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(data, offset) + 4
+    for _ in range(ancount):
+        offset = _skip_name(data, offset)
+        rtype, rclass, ttl, rdlength = struct.unpack_from("!HHIH", data, offset)
+        offset += 10
+        if rtype == 1 and rclass == 1 and rdlength == 4:
+            return socket.inet_ntoa(data[offset:offset + 4]), ttl
+        offset += rdlength
+    raise NXDomain()
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self, future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+async def udp_query(name: str, nameserver: tuple[str, int], timeout=DNS_TIMEOUT) -> tuple[str, int]:
+    loop = asyncio.get_running_loop()
+    query_id = random.randrange(0x10000)
+    future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _DNSProtocol(future), remote_addr=nameserver
+    )
+    try:
+        transport.sendto(build_query(name, query_id))
+        data = await asyncio.wait_for(future, timeout=timeout)
+    finally:
+        transport.close()
+    return parse_response(data, query_id)
+
+class AsyncResolver:
+    """
+    Resolver A-record async dengan cache TTL in-process.
+    - Lookup bersamaan untuk nama yang sama digabung (coalescing) ke satu query.
+    - NXDOMAIN/gagal resolve di-cache negatif selama negative_ttl.
+    - nameserver=(host, port) memakai query UDP langsung (mis. stub resolver lokal);
+      tanpa nameserver memakai getaddrinfo milik event loop.
+    """
+
+    def __init__(self, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL, nameserver=None, timeout=DNS_TIMEOUT):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.nameserver = nameserver
+        self.timeout = timeout
+        self._cache = {}  # nama -> (expires_at, ip atau None)
+        self._inflight = {}  # nama -> Future
+        self.stats = {"lookups": 0, "queries": 0, "hits": 0, "negative_hits": 0, "coalesced": 0, "failures": 0}
+
+    @property
+    def lookups_avoided(self) -> int:
+        return self.stats["hits"] + self.stats["negative_hits"] + self.stats["coalesced"]
+
+    def clear(self):
+        self._cache.clear()
+
+    async def _query(self, name: str) -> tuple[str, int]:
+        if self.nameserver:
+            return await udp_query(name, self.nameserver, self.timeout)
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(name, None, family=socket.AF_INET, type=socket.SOCK_STREAM),
+                timeout=self.timeout,
+            )
+        except socket.gaierror as e:
+            if e.errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)):
+                raise NXDomain() from e
+            raise
+        if not infos:
+            raise NXDomain()
+        return infos[0][4][0], self.ttl
+
+    async def _lookup(self, name: str):
+        self.stats["queries"] += 1
+        try:
+            ip, ttl = await self._query(name)
+        except NXDomain:
+            self._cache[name] = (time.monotonic() + self.negative_ttl, None)
+            return None
+        except (OSError, asyncio.TimeoutError, ValueError, UnicodeError):
+            # Gagal sementara (timeout/SERVFAIL) juga di-cache negatif agar tidak diulang terus
+            self.stats["failures"] += 1
+            self._cache[name] = (time.monotonic() + self.negative_ttl, None)
+            return None
+        self._cache[name] = (time.monotonic() + min(ttl, self.ttl), ip)
+        return ip
+
+    async def resolve(self, name: str) -> str | None:
+        if not name:
+            return None
+        if is_ipv4(name):
+            return name
+        name = name.lower().rstrip(".")
+        self.stats["lookups"] += 1
+        cached = self._cache.get(name)
+        if cached is not None:
+            expires_at, ip = cached
+            if expires_at > time.monotonic():
+                self.stats["hits" if ip else "negative_hits"] += 1
+                return ip
+            del self._cache[name]
+        future = self._inflight.get(name)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self._lookup(name))
+        self._inflight[name] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(name, None)
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(name, None))
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"DNS: {s['lookups']} lookup, {s['queries']} query ke resolver, "
+            f"{self.lookups_avoided} dihemat (cache {s['hits']}, negatif {s['negative_hits']}, "
+            f"digabung {s['coalesced']})"
+        )
+
+default_resolver = AsyncResolver()
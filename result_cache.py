@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import sqlite3
+
+RESULT_CACHE_FILE = ".result_cache.sqlite"
+RESULT_CACHE_TTL = 6 * 3600  # detik, untuk akun yang lolos tes
+RESULT_CACHE_NEGATIVE_TTL = 30 * 60  # detik, untuk akun yang gagal
+CACHED_FIELDS = (
+    "Status", "TestType", "Tested IP", "Latency", "P90", "Jitter", "Loss", "ICMP", "Country", "Provider", "Retry",
+    "Handshake",
+)
+FINAL_STATUSES = ("●", "✖", "✖ (Handshake)")
+
+class ResultCache:
+    """
+    Cache hasil probe per akun di SQLite, dikunci dengan fingerprint field koneksi.
+    Hasil sukses berlaku selama ttl, hasil gagal selama negative_ttl.
+    """
+
+    def __init__(self, path=RESULT_CACHE_FILE, ttl=RESULT_CACHE_TTL, negative_ttl=RESULT_CACHE_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results (fingerprint TEXT PRIMARY KEY, tested_at REAL, ok INTEGER, data TEXT)"
+        )
+        self.stats = {"hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, fingerprint: str) -> dict | None:
+        row = self._db.execute(
+            "SELECT tested_at, ok, data FROM results WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row:
+            tested_at, ok, data = row
+            if time.time() - tested_at <= (self.ttl if ok else self.negative_ttl):
+                self.stats["hits"] += 1
+                return json.loads(data)
+        self.stats["misses"] += 1
+        return None
+
+    def put_many(self, items: dict):
+        """Simpan {fingerprint: result}; hanya hasil tes final (●, ✖, ✖ (Handshake)) yang disimpan."""
+        now = time.time()
+        rows = [
+            (fp, now, int(res["Status"] == "●"), json.dumps({k: res.get(k) for k in CACHED_FIELDS}, ensure_ascii=False))
+            for fp, res in items.items()
+            if res.get("Status") in FINAL_STATUSES
+        ]
+        if rows:
+            self._db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+            self.stats["stores"] += len(rows)
+
+    def prune(self):
+        now = time.time()
+        self._db.execute(
+            "DELETE FROM results WHERE (ok = 1 AND tested_at < ?) OR (ok = 0 AND tested_at < ?)",
+            (now - self.ttl, now - self.negative_ttl),
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"Cache hasil: {s['hits']} akun dipakai ulang, {s['misses']} miss, {s['stores']} disimpan"
+
+def open_result_cache() -> ResultCache:
+    cache = ResultCache(
+        path=os.getenv("RESULT_CACHE_FILE", RESULT_CACHE_FILE),
+        ttl=float(os.getenv("RESULT_CACHE_TTL", RESULT_CACHE_TTL)),
+        negative_ttl=float(os.getenv("RESULT_CACHE_NEGATIVE_TTL", RESULT_CACHE_NEGATIVE_TTL)),
+    )
+    cache.prune()
+    return cache
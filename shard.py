@@ -0,0 +1,358 @@
+import sys
+import queue
+import zlib
+import asyncio
+import contextlib
+import multiprocessing
+from collections import deque
+from collections.abc import Sequence
+from converter import extract_ip_port_from_path
+from tester import new_result, CONNECT_SAMPLES
+from limiter import AdaptiveLimiter
+from result_cache import ResultCache, CACHED_FIELDS
+from metrics import get_metrics
+from core import test_all_accounts, _aiter, MAX_PENDING_ACCOUNTS
+
+SHARD_BATCH = 200  # akun per pesan parent -> worker
+RESULT_BATCH = 200  # hasil per pesan worker -> parent
+FLUSH_INTERVAL = 0.1  # detik, hasil yang tertahan di worker dikirim paling lambat selama ini
+HEARTBEAT_INTERVAL = 1.0  # detik antar tanda hidup dari worker
+SHARD_STALL_TIMEOUT = 60  # detik tanpa kabar dari shard yang masih punya akun -> shard dianggap macet
+SHARD_GRACE = 10  # detik setelah deadline sebelum shard yang belum selesai dihentikan paksa
+SHARD_FAILED = "✖ (Shard)"
+
+def shard_key(account: dict) -> str:
+    """Kunci partisi: IP di path jika ada, selain itu server. Akun satu endpoint masuk shard yang sama."""
+    ip, port = extract_ip_port_from_path(account.get("_ss_path") or account.get("_ws_path") or "")
+    if ip:
+        return f"{ip}:{port}"
+    return str(account.get("server") or "").lower()
+
+def shard_of(account: dict, shards: int) -> int:
+    # crc32, bukan hash(): stabil antar proses dan antar run
+    return zlib.crc32(shard_key(account).encode("utf-8")) % shards
+
+def limiter_options(semaphore, shards: int) -> dict:
+    """Batas konkurensi per shard: batas limiter parent dibagi rata, tidak kurang dari floor."""
+    floor = getattr(semaphore, "floor", 10)
+    limit = getattr(semaphore, "limit", 50)
+    ceiling = getattr(semaphore, "ceiling", 500)
+    return {
+        "initial": max(limit // shards, floor),
+        "floor": floor,
+        "ceiling": max(ceiling // shards, floor),
+    }
+
+def _worker_main(shard_id, inbox, outbox, options):
+    # stdout proses utama bisa berisi NDJSON; log worker selalu ke stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        asyncio.run(_worker(shard_id, inbox, outbox, options))
+
+async def _worker(shard_id, inbox, outbox, options):
+    global_index = []  # index lokal (urutan datang di shard ini) -> index global
+    buffer = []
+
+    def flush():
+        if buffer:
+            outbox.put(("r", shard_id, buffer[:]))
+            buffer.clear()
+
+    def on_result(result):
+        buffer.append((global_index[result["index"]], *(result.get(k) for k in CACHED_FIELDS)))
+        if len(buffer) >= RESULT_BATCH:
+            flush()
+
+    async def accounts():
+        while True:
+            batch = await asyncio.to_thread(inbox.get)
+            if batch is None:
+                return
+            for index, acc in batch:
+                global_index.append(index)
+                yield acc
+
+    async def pump():
+        ticks = 0
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            flush()
+            ticks += 1
+            if ticks * FLUSH_INTERVAL >= HEARTBEAT_INTERVAL:
+                ticks = 0
+                outbox.put(("h", shard_id))
+
+    result_cache = None
+    if options["result_cache"]:
+        result_cache = ResultCache(*options["result_cache"])
+    pumping = asyncio.ensure_future(pump())
+    try:
+        await test_all_accounts(
+            accounts(), AdaptiveLimiter(**options["limiter"]), deadline=options["deadline"],
+            on_result=on_result, result_cache=result_cache, force_refresh=options["force_refresh"],
+            max_pending=options["max_pending"], handshake=options["handshake"], samples=options["samples"],
+        )
+    finally:
+        pumping.cancel()
+        flush()
+        if result_cache is not None:
+            result_cache.close()
+    outbox.put(("d", shard_id, {
+        "metrics": get_metrics().state(),
+        "cache": result_cache.stats if result_cache is not None else None,
+    }))
+
+async def test_all_accounts_sharded(accounts, semaphore, shards, live_results=None, deadline=None,
+                                    on_result=None, result_cache=None, force_refresh=False,
+                                    max_pending=MAX_PENDING_ACCOUNTS, handshake=False, samples=CONNECT_SAMPLES):
+    """
+    Mode sharded test_all_accounts: akun dipartisi (shard_of) ke `shards` proses worker,
+    masing-masing dengan event loop, limiter, koneksi cache hasil dan GeoIP sendiri.
+    Worker mengirim hasil sebagai tuple ringkas (index, field CACHED_FIELDS) lewat satu
+    antrean; OriginalAccount dipasang lagi di sini, lalu live_results/on_result diperbarui
+    seperti mode biasa. Shard yang penuh menampung akun berikutnya di spill (maks. satu kali
+    batas pending per shard); jika spill juga penuh, akun dialihkan ke shard lain yang masih
+    punya ruang, jadi input hanya berhenti dibaca saat semua shard penuh. Shard yang mati atau
+    diam lebih dari SHARD_STALL_TIMEOUT (atau melewati deadline + SHARD_GRACE) dihentikan dan
+    akunnya ditandai gagal; shard lain jalan terus.
+    """
+    loop = asyncio.get_running_loop()
+    run_deadline = loop.time() + deadline if deadline else None
+    context = multiprocessing.get_context("spawn")
+    outbox = context.Queue()
+    inboxes = [context.Queue() for _ in range(shards)]
+    options = {
+        "limiter": limiter_options(semaphore, shards),
+        "result_cache": (result_cache.path, result_cache.ttl, result_cache.negative_ttl) if result_cache else None,
+        "deadline": deadline,
+        "force_refresh": force_refresh,
+        "max_pending": max(max_pending // shards, SHARD_BATCH),
+        "handshake": handshake,
+        "samples": samples,
+    }
+    workers = [
+        context.Process(target=_worker_main, args=(k, inboxes[k], outbox, options), daemon=True)
+        for k in range(shards)
+    ]
+    for worker in workers:
+        worker.start()
+
+    results = []
+    pending = {}  # index global -> (shard tujuan, akun) yang belum punya hasil
+    outstanding = [0] * shards  # akun yang sudah dikirim ke shard dan belum ada hasilnya
+    batches = [[] for _ in range(shards)]
+    spill = [deque() for _ in range(shards)]  # akun yang menunggu shard penuh (maks. cap per shard)
+    closed = [False] * shards  # penanda akhir input sudah dikirim
+    done = [False] * shards
+    dead = [False] * shards
+    last_seen = [loop.time()] * shards
+    cap = options["max_pending"]
+    input_done = False
+    progress = asyncio.Event()
+    metrics = get_metrics()
+
+    def remaining():
+        return None if run_deadline is None else max(run_deadline - loop.time(), 0)
+
+    def publish(result):
+        if live_results is not None:
+            live_results[result["index"]].update(result)
+        if on_result is not None:
+            on_result(result)
+        else:
+            results.append(result)
+
+    def fail(index, status):
+        _, acc = pending.pop(index)
+        result = new_result(acc, index)
+        result["Status"] = status
+        metrics.inc("accounts_failed")
+        publish(result)
+
+    def fail_shard(k, status):
+        lost = [i for i, (shard, _) in pending.items() if shard == k]
+        for i in lost:
+            fail(i, status)
+        outstanding[k] = 0
+        batches[k].clear()
+        spill[k].clear()
+        return len(lost)
+
+    def kill(k, status):
+        dead[k] = True
+        workers[k].kill()  # SIGKILL: proses yang macet (mis. ter-stop) tidak menanggapi SIGTERM
+        metrics.inc("shards_killed")
+        print(f"⚠️ Shard {k} dihentikan, {fail_shard(k, status)} akunnya ditandai '{status}'.")
+        progress.set()
+
+    def send(k):
+        if batches[k] and not dead[k]:
+            inboxes[k].put(batches[k][:])
+            batches[k].clear()
+
+    def dispatch(k, index, acc):
+        pending[index] = (k, acc)
+        outstanding[k] += 1
+        if live_results is not None:
+            live_results[index].update({"Status": "Testing..."})
+        batches[k].append((index, acc))
+        if len(batches[k]) >= SHARD_BATCH:
+            send(k)
+
+    def refill(k):
+        """Pindahkan akun dari spill ke shard yang sudah punya ruang; tutup input shard jika habis."""
+        while spill[k] and outstanding[k] < cap and not dead[k]:
+            dispatch(k, *spill[k].popleft())
+        if input_done and not spill[k] and not closed[k] and not dead[k]:
+            send(k)
+            inboxes[k].put(None)
+            closed[k] = True
+
+    def usable(k):
+        return not (dead[k] or done[k] or closed[k])
+
+    async def place(index, acc) -> bool:
+        """Kirim/parkir satu akun; False jika deadline habis saat semua shard penuh."""
+        while True:
+            k = shard_of(acc, shards)
+            if usable(k) and outstanding[k] < cap and not spill[k]:
+                dispatch(k, index, acc)
+                return True
+            if usable(k) and len(spill[k]) < cap:
+                # Tetap di shard asalnya agar dedup endpoint terjaga
+                pending[index] = (k, acc)
+                spill[k].append((index, acc))
+                return True
+            # Shard asal penuh (atau mati): pakai shard lain yang masih punya ruang
+            # supaya satu shard yang lambat tidak menahan input untuk shard lain
+            free = [j for j in range(shards) if usable(j) and outstanding[j] < cap]
+            if free:
+                metrics.inc("shard_rerouted")
+                dispatch(min(free, key=outstanding.__getitem__), index, acc)
+                return True
+            pending[index] = (k, acc)
+            if not any(usable(j) for j in range(shards)):
+                fail(index, SHARD_FAILED)
+                return True
+            # Semua shard penuh: backpressure yang wajar, tidak ada shard yang menganggur
+            del pending[index]
+            progress.clear()
+            try:
+                await asyncio.wait_for(progress.wait(), timeout=remaining())
+            except asyncio.TimeoutError:
+                pending[index] = (k, acc)
+                fail(index, "✖ (Deadline)")
+                return False
+
+    async def feed():
+        nonlocal input_done
+        index = 0
+        unread = False
+        source = _aiter(accounts)
+        try:
+            while True:
+                try:
+                    acc = await asyncio.wait_for(anext(source), timeout=remaining())
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    unread = True
+                    break
+                placed = await place(index, acc)
+                index += 1
+                if not placed:
+                    unread = True
+                    break
+        finally:
+            await source.aclose()
+            if unread:
+                # Akun yang masih menunggu di spill tidak sempat dikirim sebelum deadline
+                parked = [i for k in range(shards) for i, _ in spill[k]]
+                for k in range(shards):
+                    spill[k].clear()
+                for i in parked:
+                    fail(i, "✖ (Deadline)")
+                if isinstance(accounts, Sequence):
+                    # Panjang input diketahui: sisa akun ikut ditandai Deadline
+                    for i in range(index, len(accounts)):
+                        pending[i] = (None, accounts[i])
+                        fail(i, "✖ (Deadline)")
+                    metrics.inc("deadline_unread", len(accounts) - index)
+                    skipped = f"{len(accounts) - index} akun belum dites"
+                else:
+                    metrics.inc("deadline_stream_cut")
+                    skipped = "sisa input tidak dibaca"
+                print(f"⏱️ Deadline habis: {len(parked)} akun antre dihentikan, {skipped}.")
+            input_done = True
+            for k in range(shards):
+                refill(k)
+
+    def receive(message):
+        kind, k = message[0], message[1]
+        last_seen[k] = loop.time()
+        if dead[k]:
+            return  # hasil terlambat dari shard yang sudah dihentikan
+        if kind == "r":
+            for record in message[2]:
+                entry = pending.pop(record[0], None)
+                if entry is None:
+                    continue
+                outstanding[k] -= 1
+                result = new_result(entry[1], record[0])
+                result.update(zip(CACHED_FIELDS, record[1:]))
+                publish(result)
+            refill(k)
+            progress.set()
+        elif kind == "d":
+            done[k] = True
+            metrics.merge(message[2]["metrics"])
+            if result_cache is not None and message[2]["cache"]:
+                for name, n in message[2]["cache"].items():
+                    result_cache.stats[name] += n
+            # Akun yang tidak sempat dibaca worker sebelum deadline-nya habis
+            fail_shard(k, SHARD_FAILED if run_deadline is None else "✖ (Deadline)")
+            progress.set()
+
+    feeding = asyncio.ensure_future(feed())
+    try:
+        next_check = loop.time()
+        while not all(done[k] or dead[k] for k in range(shards)):
+            try:
+                receive(await asyncio.to_thread(outbox.get, True, FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+            if feeding.done() and not feeding.cancelled() and feeding.exception() is not None:
+                raise feeding.exception()
+            now = loop.time()
+            if now < next_check:
+                continue
+            # Pemeriksaan berkala, juga saat antrean tidak pernah kosong karena shard lain terus mengirim hasil
+            next_check = now + FLUSH_INTERVAL
+            for k in range(shards):
+                send(k)  # batch yang belum penuh tidak dibiarkan tertahan
+            for k in range(shards):
+                if done[k] or dead[k]:
+                    continue
+                if workers[k].exitcode not in (None, 0):
+                    kill(k, SHARD_FAILED)
+                elif run_deadline is not None and now > run_deadline + SHARD_GRACE:
+                    kill(k, "✖ (Deadline)")
+                elif outstanding[k] and now - last_seen[k] > SHARD_STALL_TIMEOUT:
+                    kill(k, SHARD_FAILED)
+        if not feeding.done():
+            # Semua shard berhenti sebelum input habis: sisa input tidak ditunggu
+            feeding.cancel()
+            await asyncio.gather(feeding, return_exceptions=True)
+            print("⚠️ Semua shard berhenti; sisa input tidak dibaca.")
+        for i in sorted(pending):
+            fail(i, SHARD_FAILED)
+    finally:
+        feeding.cancel()
+        await asyncio.gather(feeding, return_exceptions=True)
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join(timeout=5)
+        for inbox in inboxes + [outbox]:
+            inbox.cancel_join_thread()
+            inbox.close()
+    return results
@@ -1,11 +1,25 @@
 import asyncio
-import socket
+import contextlib
+import random
 import re
-from utils import is_alive, geoip_lookup, get_network_stats
+import time
+from utils import is_alive_async, sample_connect_async, connect_stats
+from pinger import ping_host
+from geoip_batch import get_geoip_batcher
 from converter import extract_ip_port_from_path
+from resolver import default_resolver
+from metrics import get_metrics
+from handshake import handshake_probe, handshake_params
 
 MAX_RETRIES = 3
-RETRY_DELAY = 1.5  # detik
+RETRY_DELAY = 1.5  # detik, backoff dasar (dikali 2 per retry, diberi jitter)
+RETRY_MAX_DELAY = 6  # detik
+ACCOUNT_BUDGET = 25  # detik, batas total waktu probe satu endpoint termasuk retry
+CONNECT_TIMEOUT = 3  # detik, per probe TCP
+HANDSHAKE_FAILED = "✖ (Handshake)"
+CONNECT_SAMPLES = 5  # sampel connect per endpoint (termasuk probe pertama); 1 = tanpa sampling
+SAMPLE_SPACING = 0.1  # detik antar mulai sampel
+SAMPLE_BUDGET = 1.0  # detik, batas waktu seluruh sampel tambahan
 
 def get_first_nonempty(*args):
     for x in args:
@@ -13,7 +27,7 @@ def get_first_nonempty(*args):
             return x
     return None
 
-def get_test_target(account):
+async def get_test_target(account, resolver=None):
     # 1. Coba IP dari path
     path_str = account.get("_ss_path") or account.get("_ws_path") or ""
     target_ip, target_port = extract_ip_port_from_path(path_str)
@@ -43,95 +57,177 @@ def get_test_target(account):
     if server:
         candidates.append(("server", server))
 
+    resolver = resolver or default_resolver
     for label, cand in candidates:
-        # Cek apakah cand adalah IP, kalau ya langsung
-        try:
-            socket.inet_aton(cand)
-            return cand, account.get("server_port", 443), label
-        except Exception:
-            pass
-        # Kalau bukan IP, resolve ke IP
-        try:
-            resolved_ip = socket.gethostbyname(cand)
+        # IP langsung dikembalikan, hostname di-resolve lewat cache async
+        resolved_ip = await resolver.resolve(cand)
+        if resolved_ip:
             return resolved_ip, account.get("server_port", 443), label
-        except Exception:
-            continue
     # Jika tidak ada yang bisa, return None
     return None, None, None
 
-async def test_account(account: dict, semaphore: asyncio.Semaphore, index: int, live_results=None) -> dict:
-    tag = account.get('tag', 'proxy')
-    vpn_type = account.get('type', 'N/A')
-    result = {
-        "index": index, "VpnType": vpn_type, "OriginalTag": tag, "Latency": -1, "Jitter": -1, "ICMP": "N/A",
+def new_result(account: dict, index: int) -> dict:
+    return {
+        "index": index, "VpnType": account.get('type', 'N/A'), "OriginalTag": account.get('tag', 'proxy'),
+        "Latency": -1, "P90": -1, "Jitter": -1, "Loss": -1, "ICMP": "N/A",
         "Country": "❓", "Provider": "-", "Tested IP": "-", "Status": "WAIT",
         "OriginalAccount": account, "TestType": "N/A", "Retry": 0
     }
 
-    async with semaphore:
-        # === LOGIKA BARU ===
-        test_ip, test_port, test_source = get_test_target(account)
-        if not test_ip:
-            result['Status'] = '✖ (No valid IP/host)'
-            return result
+def apply_probe(result: dict, probe: dict, test_source: str) -> dict:
+    """Salin hasil probe endpoint ke hasil per akun (TestType tetap per sumber target akun)."""
+    result.update({k: v for k, v in probe.items() if k != "Method"})
+    if probe.get("Method"):
+        result["TestType"] = f"{test_source.upper()} {probe['Method']}"
+    return result
 
-        for attempt in range(MAX_RETRIES):
-            result['Status'] = 'Testing...'
-            result['Retry'] = attempt
-            if live_results is not None:
-                live_results[index].update(result)
-                await asyncio.sleep(0)  # yield to event loop
-
-            is_conn, latency = is_alive(test_ip, test_port)
-            if is_conn:
-                geo_info = geoip_lookup(test_ip)
-                result.update({
-                    "Status": "●",
-                    "TestType": f"{test_source.upper()} TCP",
-                    "Tested IP": test_ip,
-                    "Latency": latency,
-                    "Jitter": 0,
-                    "ICMP": "✔",
-                    **geo_info
-                })
-                return result
+def apply_handshake(result: dict, handshake: dict) -> dict:
+    """
+    Terapkan hasil probe_handshake: sukses -> Latency diganti total waktu handshake
+    (connect + TLS + upgrade WS); gagal -> akun tidak lagi dianggap sehat.
+    """
+    result["Handshake"] = handshake
+    if handshake["ok"]:
+        result["Latency"] = sum(handshake[stage] for stage in ("connect", "tls", "ws") if handshake[stage] >= 0)
+        stages = "+".join(name for name, key in (("TLS", "tls"), ("WS", "ws")) if handshake[key] >= 0)
+        result["TestType"] = f"{result['TestType']} {stages}"
+    else:
+        result["Status"] = HANDSHAKE_FAILED
+    return result
 
-            if attempt < MAX_RETRIES - 1:
-                result['Status'] = f"Retry({attempt+1})"
-                result['Retry'] = attempt+1
-                if live_results is not None:
-                    live_results[index].update(result)
-                    await asyncio.sleep(0)
-                await asyncio.sleep(RETRY_DELAY)
-
-        # Fallback ping jika TCP gagal semua
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff dengan jitter: acak di [d/2, d], d = RETRY_DELAY * 2^attempt."""
+    delay = min(RETRY_DELAY * (2 ** attempt), RETRY_MAX_DELAY)
+    return random.uniform(delay / 2, delay)
+
+async def probe_endpoint(test_ip: str, test_port: int, on_status=None, semaphore=None, budget=ACCOUNT_BUDGET,
+                         samples=CONNECT_SAMPLES) -> dict:
+    """
+    Tes satu endpoint (ip, port): TCP dengan retry, lalu fallback ping, lalu GeoIP.
+    Setelah connect TCP pertama berhasil, samples-1 connect tambahan diambil bersamaan
+    (berselang SAMPLE_SPACING, masing-masing maksimal SAMPLE_BUDGET) untuk median/P90/jitter/loss.
+    Slot semaphore hanya dipegang selama satu percobaan; sampel tambahan mengambil slot
+    sendiri-sendiri dan ikut dilaporkan ke limiter, dan saat backoff slot dilepas
+    sehingga akun lain bisa jalan. Percobaan berhenti jika budget (detik) habis.
+    on_status(status, retry) dipanggil setiap status berubah agar tabel live ikut update.
+    """
+    probe = {"Status": "WAIT", "Retry": 0, "Method": None}
+    metrics = get_metrics()
+    probe_started = time.perf_counter()
+    semaphore = semaphore or contextlib.nullcontext()
+    record = getattr(semaphore, "record", None)  # umpan balik untuk limiter adaptif
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+
+    async def set_status(status, retry):
+        probe["Status"], probe["Retry"] = status, retry
+        if on_status is not None:
+            on_status(status, retry)
+            await asyncio.sleep(0)  # yield to event loop
+
+    # TCP dulu, fallback ping jika TCP gagal semua
+    for method in ("TCP", "Ping"):
         for attempt in range(MAX_RETRIES):
-            result['Status'] = 'Testing...'
-            result['Retry'] = attempt
-            if live_results is not None:
-                live_results[index].update(result)
-                await asyncio.sleep(0)
-
-            stats = get_network_stats(test_ip)
-            if stats.get("Latency") != -1:
-                geo_info = geoip_lookup(test_ip)
-                result.update({
+            if loop.time() >= deadline:
+                break
+            await set_status('Testing...', attempt)
+            waited = time.perf_counter()
+            async with semaphore:
+                started = time.perf_counter()
+                metrics.observe("slot_wait", started - waited)
+                metrics.inc(f"attempts_{method.lower()}")
+                if method == "TCP":
+                    is_conn, latency = await is_alive_async(test_ip, test_port, timeout=CONNECT_TIMEOUT)
+                    elapsed = time.perf_counter() - started
+                    metrics.observe("tcp_connect", elapsed)
+                    timed_out = not is_conn and elapsed >= CONNECT_TIMEOUT
+                    if timed_out:
+                        metrics.inc("timeouts")
+                    if record is not None:
+                        record(latency if is_conn else None, timed_out)
+                    stats = None
+                else:
+                    stats = await ping_host(test_ip)
+                    metrics.observe("ping", time.perf_counter() - started)
+                    stats = stats if stats.get("Latency") != -1 else None
+            if method == "TCP" and is_conn:
+                # Sampel tambahan di luar slot probe pertama
+                extra = []
+                remaining = deadline - loop.time()
+                if samples > 1 and remaining > 0:
+                    with metrics.timer("tcp_samples"):
+                        extra = await sample_connect_async(
+                            test_ip, test_port, samples - 1, SAMPLE_SPACING, min(SAMPLE_BUDGET, remaining),
+                            slot=semaphore, record=record, limit=remaining,
+                        )
+                stats = {**connect_stats([latency, *extra]), "ICMP": "N/A"}
+            if stats:
+                with metrics.timer("geoip"):
+                    geo_info = await get_geoip_batcher().lookup(test_ip)
+                probe.update({
                     "Status": "●",
-                    "TestType": f"{test_source.upper()} Ping",
+                    "Method": method,
                     "Tested IP": test_ip,
                     **stats,
                     **geo_info
                 })
-                return result
+                metrics.inc("probes_ok")
+                metrics.observe("probe", time.perf_counter() - probe_started)
+                return probe
 
             if attempt < MAX_RETRIES - 1:
-                result['Status'] = f"Retry({attempt+1})"
-                result['Retry'] = attempt+1
-                if live_results is not None:
-                    live_results[index].update(result)
-                    await asyncio.sleep(0)
-                await asyncio.sleep(RETRY_DELAY)
-
-    result['Status'] = '✖'
-    result['Retry'] = MAX_RETRIES
-    return result
\ No newline at end of file
+                delay = backoff_delay(attempt)
+                if loop.time() + delay >= deadline:
+                    break
+                await set_status(f"Retry({attempt+1})", attempt+1)
+                metrics.inc("retries")
+                with metrics.timer("retry_sleep"):
+                    await asyncio.sleep(delay)
+
+    probe['Status'] = '✖'
+    probe['Retry'] = MAX_RETRIES
+    metrics.inc("probes_failed")
+    metrics.observe("probe", time.perf_counter() - probe_started)
+    return probe
+
+async def probe_handshake(params: dict, semaphore=None, resolver=None) -> dict:
+    """
+    Handshake TLS/WebSocket ke server akun (front CDN yang dipakai klien), bukan ke
+    target probe TCP. Memakai slot semaphore yang sama dengan probe TCP.
+    """
+    metrics = get_metrics()
+    resolver = resolver or default_resolver
+    with metrics.timer("dns"):
+        ip = await resolver.resolve(params["server"])
+    if not ip:
+        metrics.inc("handshakes_failed")
+        return {"ok": False, "connect": -1, "tls": -1, "ws": -1, "error": "DNS"}
+    async with semaphore or contextlib.nullcontext():
+        with metrics.timer("handshake"):
+            handshake = await handshake_probe(ip, params)
+    for stage in ("tls", "ws"):
+        if handshake[stage] >= 0:
+            metrics.observe(f"{stage}_handshake", handshake[stage] / 1000)
+    metrics.inc("handshakes_ok" if handshake["ok"] else "handshakes_failed")
+    return handshake
+
+async def test_account(account: dict, semaphore: asyncio.Semaphore, index: int, live_results=None, handshake=False,
+                       samples=CONNECT_SAMPLES) -> dict:
+    result = new_result(account, index)
+
+    def on_status(status, retry):
+        result['Status'], result['Retry'] = status, retry
+        if live_results is not None:
+            live_results[index].update(result)
+
+    with get_metrics().timer("dns"):
+        test_ip, test_port, test_source = await get_test_target(account)
+    if not test_ip:
+        result['Status'] = '✖ (No valid IP/host)'
+        return result
+    probe = await probe_endpoint(test_ip, test_port, on_status, semaphore, samples=samples)
+    apply_probe(result, probe, test_source)
+    params = handshake_params(account) if handshake and result['Status'] == '●' else None
+    if params is not None:
+        apply_handshake(result, await probe_handshake(params, semaphore))
+    return result
@@ -1,39 +1,53 @@
 import socket
+import asyncio
+import contextlib
 import re
-import requests
 import time
 import subprocess
 import statistics
+import math
 
 def get_flag_emoji(country_code: str) -> str:
     if not isinstance(country_code, str) or len(country_code) != 2:
         return '❓'
     return "".join(chr(ord(char.upper()) - ord('A') + 0x1F1E6) for char in country_code)
 
+def get_country_code(flag: str) -> str:
+    """Kebalikan get_flag_emoji: '🇮🇩' -> 'ID'; string kosong jika bukan bendera."""
+    if not isinstance(flag, str) or len(flag) != 2:
+        return ''
+    letters = [ord(char) - 0x1F1E6 for char in flag]
+    if not all(0 <= letter < 26 for letter in letters):
+        return ''
+    return "".join(chr(letter + ord('A')) for letter in letters)
+
+def parse_ping_output(output: str, count: int) -> dict:
+    result = {"Latency": -1, "Jitter": -1, "ICMP": "Failed"}
+    latencies = [float(x) for x in re.findall(r"time=([\d.]+)", output)]
+    if not latencies:
+        return result
+    result["Latency"] = round(statistics.mean(latencies))
+    if len(latencies) > 1:
+        jitters = [abs(latencies[i] - latencies[i-1]) for i in range(1, len(latencies))]
+        result["Jitter"] = round(statistics.mean(jitters))
+    else:
+        result["Jitter"] = 0
+    loss_match = re.search(r"(\d+)% packet loss", output)
+    if loss_match and int(loss_match.group(1)) == 0:
+        result["ICMP"] = "✔"
+    else:
+        received_match = re.search(r"(\d+) packets received", output) or re.search(r"(\d+) received", output)
+        received = int(received_match.group(1)) if received_match else 0
+        result["ICMP"] = f"{received}/{count}"
+    return result
+
 def get_network_stats(host: str, count: int = 4) -> dict:
     command = ["ping", "-c", str(count), "-i", "0.2", host]
-    result = {"Latency": -1, "Jitter": -1, "ICMP": "Failed"}
     try:
         output = subprocess.check_output(command, stderr=subprocess.STDOUT, universal_newlines=True, timeout=5)
-        latencies = [float(x) for x in re.findall(r"time=([\d.]+)", output)]
-        if not latencies:
-            return result
-        result["Latency"] = round(statistics.mean(latencies))
-        if len(latencies) > 1:
-            jitters = [abs(latencies[i] - latencies[i-1]) for i in range(1, len(latencies))]
-            result["Jitter"] = round(statistics.mean(jitters))
-        else:
-            result["Jitter"] = 0
-        loss_match = re.search(r"(\d+)% packet loss", output)
-        if loss_match and int(loss_match.group(1)) == 0:
-            result["ICMP"] = "✔"
-        else:
-            received_match = re.search(r"(\d+) packets received", output) or re.search(r"(\d+) received", output)
-            received = int(received_match.group(1)) if received_match else 0
-            result["ICMP"] = f"{received}/{count}"
+        return parse_ping_output(output, count)
     except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-        pass
-    return result
+        return {"Latency": -1, "Jitter": -1, "ICMP": "Failed"}
 
 def is_alive(host, port=443, timeout=3) -> tuple[bool, int]:
     start_time = time.time()
@@ -41,23 +55,76 @@ def is_alive(host, port=443, timeout=3) -> tuple[bool, int]:
         with socket.create_connection((host, int(port)), timeout=timeout):
             latency = int((time.time() - start_time) * 1000)
             return True, latency
-    except (socket.timeout, ConnectionRefusedError, OSError, TypeError):
+    except (socket.timeout, ConnectionRefusedError, OSError, TypeError, ValueError, OverflowError):
         return False, -1
 
-def geoip_lookup(ip: str) -> dict:
-    default_result = {"Country": "❓", "Provider": "-"}
-    if not ip or not isinstance(ip, str): return default_result
+async def is_alive_async(host, port=443, timeout=3) -> tuple[bool, int]:
+    """Versi non-blocking dari is_alive: connect TCP via asyncio dengan timeout per probe."""
+    start_time = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout=timeout)
+    except (asyncio.TimeoutError, OSError, TypeError, ValueError, OverflowError):
+        return False, -1
+    latency = int((time.monotonic() - start_time) * 1000)
+    writer.close()
     try:
-        url = f"http://ip-api.com/json/{ip}?fields=status,country,countryCode,isp,org"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("status") == "success":
-                provider = data.get('org') or data.get('isp') or "-"
-                return {
-                    "Country": get_flag_emoji(data.get('countryCode', '')),
-                    "Provider": provider
-                }
-        return default_result
-    except requests.RequestException:
-        return default_result
\ No newline at end of file
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True, latency
+
+async def sample_connect_async(host, port=443, samples=4, spacing=0.1, budget=1.0, slot=None, record=None,
+                               limit=None) -> list:
+    """
+    `samples` connect TCP yang dimulai berselang `spacing` detik dan berjalan bersamaan.
+    Setiap sampel mengambil slot sendiri dari `slot` (semaphore/limiter, opsional) dan
+    dibatasi `budget` detik sejak slotnya didapat, jadi antrean slot tidak dihitung loss;
+    record(latency_ms, timed_out) dipanggil per sampel sebagai umpan balik limiter.
+    `limit` (detik) membatasi seluruh sampling termasuk menunggu slot. Return latency (ms)
+    per sampel sesuai urutan mulai; None untuk sampel yang gagal atau tidak selesai.
+    """
+    slot = slot or contextlib.nullcontext()
+
+    async def sample(delay):
+        await asyncio.sleep(delay)
+        async with slot:
+            started = time.monotonic()
+            is_conn, latency = await is_alive_async(host, port, timeout=budget)
+            if record is not None:
+                record(latency if is_conn else None, not is_conn and time.monotonic() - started >= budget)
+        return latency if is_conn else None
+
+    tasks = [asyncio.ensure_future(sample(i * spacing)) for i in range(samples)]
+    _, pending = await asyncio.wait(tasks, timeout=limit)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return [task.result() if task not in pending else None for task in tasks]
+
+def connect_stats(samples: list) -> dict | None:
+    """
+    Statistik dari sampel connect (ms, None = gagal): Latency = median, P90, Jitter = rata-rata
+    selisih sampel berurutan (seperti parse_ping_output), Loss = persen sampel gagal.
+    """
+    latencies = [s for s in samples if s is not None]
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    jitters = [abs(latencies[i] - latencies[i-1]) for i in range(1, len(latencies))]
+    return {
+        "Latency": round(statistics.median(latencies)),
+        "P90": ordered[max(math.ceil(0.9 * len(ordered)) - 1, 0)],
+        "Jitter": round(statistics.mean(jitters)) if jitters else 0,
+        "Loss": round(100 * (len(samples) - len(latencies)) / len(samples)),
+    }
+
+GEOIP_DEFAULT = {"Country": "❓", "Provider": "-"}
+
+def geo_from_api(data: dict) -> dict | None:
+    """Ubah satu entri respons ip-api menjadi {"Country", "Provider"}; None jika gagal."""
+    if not isinstance(data, dict) or data.get("status") != "success":
+        return None
+    return {
+        "Country": get_flag_emoji(data.get('countryCode', '')),
+        "Provider": data.get('org') or data.get('isp') or "-"
+    }
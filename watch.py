@@ -0,0 +1,223 @@
+import sys
+import copy
+import math
+import time
+import argparse
+import asyncio
+import contextlib
+from dotenv import load_dotenv
+
+from core import test_all_accounts
+from extractor import extract_accounts_from_config
+from fingerprint import account_fingerprint
+from limiter import AdaptiveLimiter
+from metrics import get_metrics
+from geoip_offline import get_offline_geoip
+from ranking import Ranker
+from batch import (
+    add_common_args, check_common_args, make_github_client, load_source_config, iter_all_accounts,
+    build_outputs, save_outputs, commit_outputs, log,
+    MIN_CONCURRENT_TESTS, INITIAL_CONCURRENT_TESTS, MAX_CONCURRENT_TESTS,
+)
+
+WATCH_INTERVAL = 10 * 60  # detik, setiap akun dites ulang sekali per interval
+WATCH_TICK = 5  # detik antar giliran tes kecil
+MIN_PUBLISH_INTERVAL = 60  # detik minimal antar publish
+FAIL_THRESHOLD = 2  # gagal berturut-turut sebelum akun dianggap mati
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mode watch VortexVpn: tes ulang akun terus-menerus secara bertahap dan "
+                    "publish config hanya jika akun sehat atau ranking-nya berubah."
+    )
+    add_common_args(parser)
+    parser.set_defaults(commit_message="Update config VortexVpn (watch)")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL,
+                        help="detik untuk satu putaran tes ulang seluruh akun")
+    parser.add_argument("--tick", type=float, default=WATCH_TICK,
+                        help="detik antar giliran; tiap giliran mengetes bagian akun yang sudah jatuh tempo")
+    parser.add_argument("--min-publish-interval", type=float, default=MIN_PUBLISH_INTERVAL,
+                        help="jarak minimal (detik) antar publish")
+    parser.add_argument("--fail-threshold", type=int, default=FAIL_THRESHOLD,
+                        help="jumlah gagal berturut-turut sebelum akun dikeluarkan dari config")
+    args = parser.parse_args(argv)
+    check_common_args(parser, args)
+    if args.interval <= 0 or args.tick <= 0:
+        parser.error("--interval dan --tick harus lebih dari 0")
+    return args
+
+class HealthBook:
+    """
+    Status kesehatan per akun (kunci: fingerprint): hasil tes sukses terakhir dan jumlah
+    gagal berturut-turut. Akun baru dianggap mati setelah fail_threshold kegagalan, supaya
+    satu probe yang kebetulan gagal tidak langsung mengubah config.
+    """
+
+    def __init__(self, fail_threshold=FAIL_THRESHOLD):
+        self.fail_threshold = max(fail_threshold, 1)
+        self._last_ok = {}  # fingerprint -> hasil sukses terakhir
+        self._failures = {}  # fingerprint -> gagal berturut-turut
+
+    def update(self, result: dict):
+        fingerprint = account_fingerprint(result["OriginalAccount"])
+        if result["Status"] == "●":
+            self._last_ok[fingerprint] = result
+            self._failures.pop(fingerprint, None)
+            return
+        failures = self._failures.get(fingerprint, 0) + 1
+        self._failures[fingerprint] = failures
+        if failures >= self.fail_threshold:
+            self._last_ok.pop(fingerprint, None)
+
+    def healthy(self) -> list:
+        return list(self._last_ok.values())
+
+    def __len__(self) -> int:
+        return len(self._last_ok)
+
+def publish_signature(ranked: list) -> frozenset:
+    """
+    Keanggotaan config: akun terpilih beserta negara/provider (bahan tag).
+    Urutan sengaja tidak dihitung; jitter latency antar ronde mengubah urutan
+    tanpa mengubah akun yang dipakai, dan tidak perlu commit baru.
+    """
+    return frozenset(
+        (account_fingerprint(res["OriginalAccount"]), res.get("Country"), res.get("Provider"))
+        for res in ranked
+    )
+
+class Watcher:
+    def __init__(self, args, accounts, source_config=None, github_client=None):
+        self.args = args
+        self.accounts = accounts
+        self.source_config = source_config
+        self.github_client = github_client
+        self.health = HealthBook(args.fail_threshold)
+        self.limiter = AdaptiveLimiter(
+            initial=INITIAL_CONCURRENT_TESTS, floor=MIN_CONCURRENT_TESTS, ceiling=MAX_CONCURRENT_TESTS
+        )
+        self.published = None  # signature (keanggotaan) config yang terakhir berhasil dipublish
+        self.last_publish = None
+        self.stats = {"probed": 0, "publishes": 0, "skipped": 0}
+        self._in_flight = set()  # id akun yang probe-nya belum selesai
+        self._tasks = set()
+
+    async def probe(self, accounts):
+        ids = {id(acc) for acc in accounts}
+        self._in_flight |= ids
+        try:
+            await test_all_accounts(
+                accounts, self.limiter, deadline=self.args.interval, on_result=self.on_result,
+                handshake=self.args.handshake, samples=max(self.args.samples, 1),
+            )
+        finally:
+            self._in_flight -= ids
+
+    def probe_in_background(self, accounts):
+        """Giliran tes berjalan di latar; akun yang probe sebelumnya belum selesai dilewati."""
+        accounts = [acc for acc in accounts if id(acc) not in self._in_flight]
+        if accounts:
+            task = asyncio.ensure_future(self.probe(accounts))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def on_result(self, result):
+        self.stats["probed"] += 1
+        self.health.update(result)
+
+    def rank(self) -> list:
+        ranker = Ranker(top_k=max(self.args.top_k, 0), preference=self.args.prefer)
+        for result in self.health.healthy():
+            ranker.offer(result)
+        return ranker.ranked()
+
+    async def maybe_publish(self, force=False):
+        ranked = self.rank()
+        if not ranked:
+            log("⚠️ Tidak ada akun sehat; config terakhir dibiarkan.")
+            return
+        signature = publish_signature(ranked)
+        if signature == self.published:
+            return
+        now = time.monotonic()
+        if not force and self.last_publish is not None and now - self.last_publish < self.args.min_publish_interval:
+            self.stats["skipped"] += 1
+            return
+        # Salinan: build_final_accounts memberi tag baru pada akun, sementara akun tetap dites
+        ranked = [dict(res, OriginalAccount=copy.deepcopy(res["OriginalAccount"])) for res in ranked]
+        variants = build_outputs(self.args, ranked, self.source_config)
+        if self.args.output:
+            save_outputs(self.args.output, variants, compact=self.args.compact)
+        if self.args.upload:
+            message = f"{self.args.commit_message} ({len(ranked)} akun)"
+            response = await asyncio.to_thread(
+                commit_outputs, self.github_client, self.args.upload, variants, message, self.args.compact
+            )
+            if response is None:
+                return  # dicoba lagi di giliran berikutnya
+        self.published = signature
+        self.last_publish = now
+        self.stats["publishes"] += 1
+        log(f"📤 Config dipublish: {len(ranked)} akun terpilih dari {len(self.health)} akun sehat.")
+
+    async def run(self):
+        log(f"Tes awal {len(self.accounts)} akun...")
+        await self.probe(self.accounts)
+        await self.maybe_publish(force=True)
+        loop = asyncio.get_running_loop()
+        total = len(self.accounts)
+        cycle_start = loop.time()
+        position = 0
+        try:
+            while True:
+                await asyncio.sleep(self.args.tick)
+                # Akun ke-i jatuh tempo pada cycle_start + i * interval / total: beban tersebar rata
+                elapsed = loop.time() - cycle_start
+                due_until = min(total, math.ceil(total * elapsed / self.args.interval))
+                if due_until > position:
+                    self.probe_in_background(self.accounts[position:due_until])
+                    position = due_until
+                await self.maybe_publish()
+                if position >= total:
+                    self.cycle_done()
+                    cycle_start += self.args.interval
+                    position = 0
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def cycle_done(self):
+        metrics = get_metrics()
+        log(
+            f"Putaran selesai: {len(self.health)}/{len(self.accounts)} akun sehat, "
+            f"{self.stats['publishes']} publish, {self.stats['skipped']} ditunda. {self.limiter.summary()}"
+        )
+        log(metrics.summary())
+        if self.args.metrics:
+            metrics.save(self.args.metrics)
+
+async def run(args) -> int:
+    load_dotenv()
+    get_offline_geoip()  # database offline yang rusak dilaporkan sekarang, bukan di tengah pengetesan
+    github_client = make_github_client(args.repo)
+    source_config, _ = load_source_config(args, github_client)
+    existing_accounts = extract_accounts_from_config(copy.deepcopy(source_config)) if source_config else []
+    accounts = list(iter_all_accounts(existing_accounts, args.links))
+    if not accounts:
+        log("❌ Tidak ada akun valid untuk dites.")
+        return 1
+    await Watcher(args, accounts, source_config, github_client).run()
+    return 0
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        log("Watch dihentikan.")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())